@@ -0,0 +1,124 @@
+import asyncio
+import contextlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+from data.cache import cache_from_env
+from data.infer import get_engine, parse_record, REQUIRED_FIELDS, MAX_BATCH_RECORDS
+
+# Threads running LightGBM/torch; the event loop itself only parses and validates
+INFERENCE_THREADS = int(os.environ.get('ASGI_INFERENCE_THREADS', os.cpu_count() or 1))
+# Requests allowed to wait for or run inference before new ones get a 503
+MAX_PENDING = int(os.environ.get('ASGI_MAX_PENDING', INFERENCE_THREADS * 8))
+RETRY_AFTER_SECONDS = os.environ.get('ASGI_RETRY_AFTER', '1')
+
+cache = cache_from_env(get_engine)
+executor = ThreadPoolExecutor(max_workers=INFERENCE_THREADS, thread_name_prefix='inference')
+pending = 0
+
+
+class Overloaded(Exception):
+    pass
+
+
+async def run_inference(fn, *args):
+    # Only touched from the event loop thread, so no lock is needed
+    global pending
+    if pending >= MAX_PENDING:
+        raise Overloaded()
+    pending += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(executor, fn, *args)
+    finally:
+        pending -= 1
+
+
+def overloaded_response():
+    return JSONResponse({'error': 'Server is busy, retry later'}, status_code=503,
+                        headers={'Retry-After': RETRY_AFTER_SECONDS})
+
+
+async def read_json(request):
+    try:
+        return await request.json()
+    except ValueError:
+        return None
+
+
+async def predict(request):
+    data = await read_json(request)
+    if not isinstance(data, dict):
+        return JSONResponse({'error': 'Expected a JSON object'}, status_code=400)
+
+    missing_fields = [field for field in REQUIRED_FIELDS if field not in data]
+
+    if missing_fields:
+        return JSONResponse({'error': f'Missing fields: {", ".join(missing_fields)}'}, status_code=400)
+
+    try:
+        parsed = parse_record(data)
+    except (ValueError, TypeError) as e:
+        return JSONResponse({'error': str(e)}, status_code=400)
+
+    key = None
+    if cache is not None:
+        # Cache hits are answered on the event loop without touching the executor
+        parsed = cache.quantise(parsed)
+        key = cache.key(parsed)
+        prediction = cache.get(key)
+        if prediction is not None:
+            return JSONResponse({'prediction': prediction})
+
+    try:
+        prediction = await run_inference(get_engine().predict, *parsed)
+        if key is not None:
+            cache.set(key, prediction)
+        return JSONResponse({'prediction': prediction})
+    except Overloaded:
+        return overloaded_response()
+    except Exception as e:
+        return JSONResponse({'error': str(e)}, status_code=500)
+
+
+async def predict_batch(request):
+    data = await read_json(request)
+    records = data.get('records') if isinstance(data, dict) else data
+
+    if not isinstance(records, list):
+        return JSONResponse({'error': 'Expected a list of records or {"records": [...]}'}, status_code=400)
+    if len(records) > MAX_BATCH_RECORDS:
+        return JSONResponse({'error': f'At most {MAX_BATCH_RECORDS} records per batch'}, status_code=413)
+
+    try:
+        return JSONResponse({'predictions': await run_inference(get_engine().predict_records, records)})
+    except Overloaded:
+        return overloaded_response()
+    except Exception as e:
+        return JSONResponse({'error': str(e)}, status_code=500)
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    import torch
+
+    # Split the cores between concurrently running inference threads
+    torch.set_num_threads(max(1, (os.cpu_count() or 1) // INFERENCE_THREADS))
+    await asyncio.get_running_loop().run_in_executor(executor, get_engine)
+    yield
+    executor.shutdown(wait=True)
+
+
+app = Starlette(
+    routes=[
+        Route('/predict', predict, methods=['POST']),
+        Route('/predict/batch', predict_batch, methods=['POST']),
+    ],
+    middleware=[Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'])],
+    lifespan=lifespan,
+)
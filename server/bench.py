@@ -0,0 +1,211 @@
+import argparse
+import json
+import platform
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from data.location import CLIENT_STATIONS_PATH
+from data.profiling import profile
+
+TEST_CSV = 'data/csvs/df_test.csv'
+STAGES = ['load', 'amenities', 'features', 'scaling', 'lightgbm', 'mlp', 'tabtransformer', 'blend']
+
+
+def sample_inputs(n, seed=0):
+    # Locations from the client's station list; flat type, area, month and year from df_test.csv
+    rng = np.random.default_rng(seed)
+    stations = pd.read_csv(CLIENT_STATIONS_PATH)
+    test = pd.read_csv(TEST_CSV)
+    s = stations.iloc[rng.integers(0, len(stations), n)].reset_index(drop=True)
+    t = test.iloc[rng.integers(0, len(test), n)].reset_index(drop=True)
+    months = t[[f'month_{i}' for i in range(1,13)]].values.argmax(axis=1) + 1
+    years = np.array([2021,2022,2023,2024,2025])[t[[f'year_{y}' for y in [2021,2022,2023,2024,2025]]].values.argmax(axis=1)]
+    flat_types = ['EXECUTIVE' if k == 0 else f'{k}-ROOM' for k in t['flat_type_int'].astype(int)]
+    return [(float(lat), float(lng), ft, round(float(sqm) * 10.764, 1), int(m), int(y))
+            for lat, lng, ft, sqm, m, y in zip(s['lat'], s['lng'], flat_types, t['floor_area_sqm'], months, years)]
+
+
+def summarise(seconds):
+    ms = 1000.0 * np.asarray(seconds)
+    return {
+        'count': int(len(ms)),
+        'mean_ms': float(ms.mean()),
+        'p50_ms': float(np.percentile(ms, 50)),
+        'p95_ms': float(np.percentile(ms, 95)),
+        'p99_ms': float(np.percentile(ms, 99)),
+    }
+
+
+def summarise_stages(profiles):
+    return {name: summarise([p.get(name, 0.0) for p in profiles]) for name in STAGES[1:]
+            if any(name in p for p in profiles)}
+
+
+def bench_single(engine, inputs):
+    latencies, profiles = [], []
+    for parsed in inputs:
+        start = time.perf_counter()
+        with profile() as stages:
+            engine.predict(*parsed)
+        latencies.append(time.perf_counter() - start)
+        profiles.append(stages)
+    return {
+        'latency': summarise(latencies),
+        'throughput_per_s': len(inputs) / sum(latencies),
+        'stages': summarise_stages(profiles),
+    }
+
+
+def bench_batch(engine, inputs, batch_size, repeats):
+    latencies, profiles = [], []
+    for r in range(repeats):
+        start_row = (r * batch_size) % max(1, len(inputs) - batch_size + 1)
+        batch = inputs[start_row:start_row + batch_size]
+        start = time.perf_counter()
+        with profile() as stages:
+            engine.predict_parsed(batch)
+        latencies.append(time.perf_counter() - start)
+        profiles.append(stages)
+    return {
+        'batch_size': batch_size,
+        'latency': summarise(latencies),
+        'throughput_per_s': batch_size * repeats / sum(latencies),
+        'stages': summarise_stages(profiles),
+    }
+
+
+def bench_concurrent(engine, inputs, clients, microbatch):
+    if microbatch:
+        from data.batching import MicroBatcher
+        batcher = MicroBatcher(lambda: engine)
+        call = batcher.predict
+    else:
+        batcher = None
+        call = lambda parsed: engine.predict(*parsed)
+
+    latencies = []
+    lock = threading.Lock()
+
+    def client(parsed):
+        start = time.perf_counter()
+        call(parsed)
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        list(pool.map(client, inputs))
+    wall = time.perf_counter() - start
+
+    result = {
+        'clients': clients,
+        'microbatch': microbatch,
+        'latency': summarise(latencies),
+        'throughput_per_s': len(inputs) / wall,
+    }
+    if batcher is not None:
+        result['batcher'] = batcher.stats()
+    return result
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current, baseline):
+    # Prints p50 ratios (current / baseline) for every scenario present in both
+    def rows(results):
+        out = {'single': results['single']['latency']['p50_ms']}
+        for b in results['batch']:
+            out[f"batch-{b['batch_size']}"] = b['latency']['p50_ms']
+        for c in results['concurrent']:
+            out[f"concurrent-{c['clients']}{'-microbatch' if c['microbatch'] else ''}"] = c['latency']['p50_ms']
+        return out
+
+    now, before = rows(current), rows(baseline)
+    print(f"{'scenario':<28}{'baseline p50':>14}{'current p50':>14}{'ratio':>8}")
+    for name in now:
+        if name in before:
+            print(f"{name:<28}{before[name]:>14.3f}{now[name]:>14.3f}{now[name] / before[name]:>8.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the prediction pipeline with a per-stage breakdown.')
+    parser.add_argument('--requests', type=int, default=500, help='single and concurrent requests')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 16, 256, 4096])
+    parser.add_argument('--batch-repeats', type=int, default=20)
+    parser.add_argument('--clients', type=int, nargs='+', default=[8, 32])
+    parser.add_argument('--microbatch', action='store_true', help='also run concurrent scenarios through MicroBatcher')
+    parser.add_argument('--no-location-cache', action='store_true', help='recompute amenity geometry on every call')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', default='bench_results.json')
+    parser.add_argument('--compare', help='earlier results file to compare against')
+    args = parser.parse_args()
+
+    import torch
+    from data.infer import InferenceEngine
+
+    start = time.perf_counter()
+    engine = InferenceEngine()
+    load_seconds = time.perf_counter() - start
+    if args.no_location_cache:
+        engine.locations.known.clear()
+        engine.locations.max_entries = 0
+
+    # Keep only inputs the models can score (some stations have no mrt_index); this
+    # pass also warms up lazy allocations before anything is timed
+    needed = max(args.requests, max(args.batch_sizes))
+    candidates = sample_inputs(2 * needed, seed=args.seed)
+    inputs = [p for p, r in zip(candidates, engine.predict_parsed(candidates)) if 'prediction' in r]
+    inputs = (inputs * (needed // max(1, len(inputs)) + 1))[:needed]
+
+    results = {
+        'commit': git_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'torch': torch.__version__,
+        'torch_threads': torch.get_num_threads(),
+        'backend': engine.backend,
+        'config': vars(args),
+        'load_ms': 1000.0 * load_seconds,
+        'single': bench_single(engine, inputs[:args.requests]),
+        'batch': [bench_batch(engine, inputs, size, args.batch_repeats) for size in args.batch_sizes],
+        'concurrent': [bench_concurrent(engine, inputs[:args.requests], clients, False) for clients in args.clients],
+    }
+    if args.microbatch:
+        results['concurrent'] += [bench_concurrent(engine, inputs[:args.requests], clients, True)
+                                  for clients in args.clients]
+
+    with open(args.out, 'w') as f:
+        json.dump(results, f, indent=2)
+
+    single = results['single']
+    print(f"load {results['load_ms']:.0f} ms")
+    print(f"single: p50 {single['latency']['p50_ms']:.3f} ms, p99 {single['latency']['p99_ms']:.3f} ms, "
+          f"{single['throughput_per_s']:.0f}/s")
+    for name, summary in single['stages'].items():
+        print(f"  {name:<16} p50 {summary['p50_ms']:.3f} ms  p95 {summary['p95_ms']:.3f} ms")
+    for b in results['batch']:
+        print(f"batch-{b['batch_size']}: p50 {b['latency']['p50_ms']:.3f} ms, {b['throughput_per_s']:.0f} rows/s")
+    for c in results['concurrent']:
+        label = f"concurrent-{c['clients']}{' microbatch' if c['microbatch'] else ''}"
+        print(f"{label}: p50 {c['latency']['p50_ms']:.3f} ms, p99 {c['latency']['p99_ms']:.3f} ms, "
+              f"{c['throughput_per_s']:.0f}/s")
+    print(f"Wrote {args.out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+import argparse
+import hashlib
+import json
+import numpy as np
+
+ARTIFACT_VERSION = 1
+ARTIFACT_PATH = 'models/preprocessing.json'
+MODEL_PATHS = {
+    'lgbm': 'models/lgbm_model.pkl',
+    'mlp': 'models/best_mlp.pt',
+    'tt': 'models/best_tt.pt',
+}
+
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def load_training_frame(train_csv):
+    import pandas as pd
+
+    df = pd.read_csv(train_csv)
+    df['month'] = df[[f'month_{i}' for i in range(1,13)]].idxmax(axis=1).str.extract(r'(\d+)').astype(int)
+    df['year']  = df[[f'year_{y}' for y in [2021,2022,2023,2024,2025]]].idxmax(axis=1).str[-4:].astype(int)
+    df.drop(columns=[*[f'month_{i}' for i in range(1,13)], *[f'year_{y}' for y in [2021,2022,2023,2024,2025]]], inplace=True)
+    return df
+
+
+def export_artifacts(train_csv='data/csvs/df_random_train.csv', out=ARTIFACT_PATH, model_paths=MODEL_PATHS):
+    from sklearn.preprocessing import StandardScaler, OneHotEncoder
+    from data.infer import NUM_FEATS, CAT_FEATS
+
+    df = load_training_frame(train_csv)
+    # Same 80% split the models were trained on
+    train_df = df.sample(frac=0.8, random_state=42).reset_index(drop=True)
+    scaler = StandardScaler().fit(train_df[NUM_FEATS])
+    oh = OneHotEncoder(sparse_output=False, handle_unknown='ignore').fit(train_df[CAT_FEATS])
+
+    # TabTransformer codes follow pd.Categorical over the full frame, which is
+    # also where the embedding cardinalities come from
+    cat_codes = {c: sorted(df[c].unique().tolist()) for c in CAT_FEATS}
+
+    artifact = {
+        'version': ARTIFACT_VERSION,
+        'num_feats': NUM_FEATS,
+        'cat_feats': CAT_FEATS,
+        'scaler_mean': scaler.mean_.tolist(),
+        'scaler_scale': scaler.scale_.tolist(),
+        'oh_categories': [cats.tolist() for cats in oh.categories_],
+        'cat_codes': cat_codes,
+        'cat_cards': [int(df[c].nunique()) for c in CAT_FEATS],
+        'model_sha256': {name: file_sha256(path) for name, path in model_paths.items()},
+    }
+    with open(out, 'w') as f:
+        json.dump(artifact, f)
+    return artifact
+
+
+class Preprocessor:
+    """Fitted scaler, one-hot vocabulary and TabTransformer code maps, loaded from the exported artifact."""
+
+    def __init__(self, artifact, fingerprint=None):
+        # fingerprint identifies this exact combination of preprocessing and weights
+        self.fingerprint = fingerprint
+        self.num_feats = artifact['num_feats']
+        self.cat_feats = artifact['cat_feats']
+        self.mean = np.asarray(artifact['scaler_mean'], dtype=np.float64)
+        self.scale_ = np.asarray(artifact['scaler_scale'], dtype=np.float64)
+        self.oh_categories = [np.asarray(cats, dtype=np.float64) for cats in artifact['oh_categories']]
+        self.code_values = [np.asarray(artifact['cat_codes'][c], dtype=np.float64) for c in self.cat_feats]
+        self.cat_cards = artifact['cat_cards']
+        self.one_hot_width = sum(len(cats) for cats in self.oh_categories)
+
+    def scale(self, X_num):
+        return (np.asarray(X_num, dtype=np.float64) - self.mean) / self.scale_
+
+    def one_hot(self, X_cat):
+        # Equivalent to OneHotEncoder(handle_unknown='ignore'): unknown values encode as all zeros
+        X_cat = np.asarray(X_cat, dtype=np.float64)
+        blocks = []
+        for j, cats in enumerate(self.oh_categories):
+            blocks.append(_lookup(cats, X_cat[:, j])[1][:, None] == np.arange(len(cats)))
+        return np.hstack(blocks).astype(np.float64)
+
+    def codes(self, X_cat):
+        # Values never seen in training map to code 0
+        X_cat = np.asarray(X_cat, dtype=np.float64)
+        out = np.zeros(X_cat.shape, dtype=np.int64)
+        for j, values in enumerate(self.code_values):
+            found, idx = _lookup(values, X_cat[:, j])
+            out[:, j] = np.where(found, idx, 0)
+        return out
+
+
+def _lookup(sorted_values, x):
+    idx = np.searchsorted(sorted_values, x)
+    idx_c = np.clip(idx, 0, len(sorted_values) - 1)
+    found = sorted_values[idx_c] == x
+    return found, np.where(found, idx_c, -1)
+
+
+def load_artifacts(path=ARTIFACT_PATH, model_paths=MODEL_PATHS):
+    with open(path) as f:
+        artifact = json.load(f)
+
+    if artifact.get('version') != ARTIFACT_VERSION:
+        raise RuntimeError(f"{path} has artifact version {artifact.get('version')}, expected {ARTIFACT_VERSION}; "
+                           f"re-run `python -m data.artifacts`")
+    for name, model_path in model_paths.items():
+        expected = artifact['model_sha256'].get(name)
+        if expected != file_sha256(model_path):
+            raise RuntimeError(f"{model_path} does not match the weights {path} was exported for; "
+                               f"re-run `python -m data.artifacts`")
+    return Preprocessor(artifact, fingerprint=file_sha256(path)[:16])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Export fitted preprocessing artifacts next to the model weights.')
+    parser.add_argument('--train-csv', default='data/csvs/df_random_train.csv')
+    parser.add_argument('--out', default=ARTIFACT_PATH)
+    args = parser.parse_args()
+    export_artifacts(args.train_csv, args.out)
+    print(f"Wrote {args.out}")
@@ -0,0 +1,110 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class MicroBatcher:
+    """Collects single predictions for up to max_wait_ms (or max_batch_size requests)
+    and scores them in one vectorised pass through the ensemble."""
+
+    def __init__(self, get_engine, max_batch_size=64, max_wait_ms=5.0):
+        # get_engine is called per batch so a reloaded engine is picked up
+        self.get_engine = get_engine
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.queue = None
+
+        self._stats_lock = threading.Lock()
+        self._requests = 0
+        self._batches = 0
+        self._largest_batch = 0
+        self._last_batch_size = 0
+        # Upper bound of each batch size bucket -> count
+        self._size_buckets = {}
+        bound = 1
+        while bound < max_batch_size:
+            self._size_buckets[bound] = 0
+            bound *= 2
+        self._size_buckets[max_batch_size] = 0
+
+        # The worker thread is started on first use, and again in each forked
+        # server worker since threads do not survive fork
+        self._start_lock = threading.Lock()
+        self._pid = None
+
+    def _ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid != os.getpid():
+                self.queue = queue.Queue()
+                threading.Thread(target=self._run, args=(self.queue,), name='micro-batcher', daemon=True).start()
+                self._pid = os.getpid()
+
+    def submit(self, parsed):
+        # parsed is a tuple from parse_record; resolves to {'prediction': ...} or {'error': ...}
+        self._ensure_started()
+        future = Future()
+        self.queue.put((parsed, future))
+        return future
+
+    def predict(self, parsed, timeout=None):
+        return self.submit(parsed).result(timeout)
+
+    def _collect(self, q):
+        batch = [q.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(q.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self, q):
+        while True:
+            batch = self._collect(q)
+            try:
+                results = self.get_engine().predict_parsed([parsed for parsed, _ in batch])
+            except Exception:
+                # Rescored one request at a time, so a request that breaks the batch
+                # only fails itself and not the others that happened to share it
+                for parsed, future in batch:
+                    try:
+                        future.set_result(self.get_engine().predict_parsed([parsed])[0])
+                    except Exception as e:
+                        future.set_exception(e)
+            else:
+                for (_, future), result in zip(batch, results):
+                    future.set_result(result)
+            self._record(len(batch))
+
+    def _record(self, size):
+        with self._stats_lock:
+            self._requests += size
+            self._batches += 1
+            self._largest_batch = max(self._largest_batch, size)
+            self._last_batch_size = size
+            for bound in self._size_buckets:
+                if size <= bound:
+                    self._size_buckets[bound] += 1
+                    break
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                'queue_depth': self.queue.qsize() if self.queue is not None else 0,
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': self.max_wait * 1000.0,
+                'requests': self._requests,
+                'batches': self._batches,
+                'mean_batch_size': self._requests / self._batches if self._batches else 0.0,
+                'largest_batch_size': self._largest_batch,
+                'last_batch_size': self._last_batch_size,
+                'batch_size_buckets': {str(bound): count for bound, count in self._size_buckets.items()},
+            }
@@ -0,0 +1,83 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from data.location import ADDRESS_PATH
+from data.spatial import AmenityIndex
+
+HDB_PROPERTY_PATH = 'data/csvs/HDBPropertyInformation.csv'
+
+# Building age is measured from the same year as in 01_rent_data_initial.ipynb
+AGE_REFERENCE_YEAR = 2025
+# Further than this from any known block, fall back to BUILDING_DEFAULTS
+MAX_BLOCK_DISTANCE_KM = 0.3
+
+FLAG_COLUMNS = ['residential', 'commercial', 'market_hawker', 'miscellaneous',
+                'multistorey_carpark', 'precinct_pavilion']
+BUILDING_COLUMNS = ['max_floor_lvl', *FLAG_COLUMNS, 'age_of_bldg', 'town_index']
+
+# Hardcoded, based on median value observed in dataset
+BUILDING_DEFAULTS = {
+    'max_floor_lvl': 13.0,
+    'residential': 1,
+    'commercial': 0,
+    'market_hawker': 0,
+    'miscellaneous': 0,
+    'multistorey_carpark': 0,
+    'precinct_pavilion': 0,
+    'age_of_bldg': 38,
+    'town_index': 0.454545,
+}
+
+# bldg_contract_town code -> town name, as used by town_index_all
+TOWN_CODES = {
+    'AMK': 'ANG MO KIO', 'BB': 'BUKIT BATOK', 'BD': 'BEDOK', 'BH': 'BISHAN', 'BM': 'BUKIT MERAH',
+    'BP': 'BUKIT PANJANG', 'BT': 'BUKIT TIMAH', 'CCK': 'CHOA CHU KANG', 'CL': 'CLEMENTI',
+    'CT': 'CENTRAL', 'GL': 'GEYLANG', 'HG': 'HOUGANG', 'JE': 'JURONG EAST', 'JW': 'JURONG WEST',
+    'KWN': 'KALLANG/WHAMPOA', 'MP': 'MARINE PARADE', 'PG': 'PUNGGOL', 'PRC': 'PASIR RIS',
+    'QT': 'QUEENSTOWN', 'SB': 'SEMBAWANG', 'SGN': 'SERANGOON', 'SK': 'SENGKANG', 'TAP': 'TAMPINES',
+    'TG': 'TENGAH', 'TP': 'TOA PAYOH', 'WL': 'WOODLANDS', 'YS': 'YISHUN',
+}
+
+
+def default_building_features(n):
+    return np.tile([float(BUILDING_DEFAULTS[c]) for c in BUILDING_COLUMNS], (n, 1))
+
+
+class BuildingIndex:
+    """Attributes of the nearest geocoded HDB block, as an (N, len(BUILDING_COLUMNS)) array."""
+
+    def __init__(self, lats, longs, values):
+        self.index = AmenityIndex(np.arange(len(values)), lats, longs)
+        self.values = np.asarray(values, dtype=np.float64)
+
+    def lookup(self, lats, longs):
+        idx, dist = self.index.query_batch(lats, longs)
+        out = self.values[idx.astype(np.int64)]
+        far = dist > MAX_BLOCK_DISTANCE_KM
+        if far.any():
+            out[far] = default_building_features(int(far.sum()))
+        return out
+
+
+def load_building_index(town_index, property_path=HDB_PROPERTY_PATH, address_path=ADDRESS_PATH):
+    # Block coordinates come from the geocoded addresses; without them there is nothing to index
+    if not os.path.exists(address_path):
+        return None
+
+    props = pd.read_csv(property_path)
+    props['key'] = (props['blk_no'].astype(str).str.strip().str.upper() + ' '
+                    + props['street'].astype(str).str.strip().str.upper())
+    addrs = pd.read_csv(address_path)
+    addrs['key'] = addrs['Search Name'].astype(str).str.strip().str.upper()
+    merged = props.merge(addrs[['key', 'Address Lat', 'Address Long']].drop_duplicates('key'), on='key', how='inner')
+
+    values = pd.DataFrame({'max_floor_lvl': merged['max_floor_lvl'].astype(float)})
+    for c in FLAG_COLUMNS:
+        values[c] = (merged[c] == 'Y').astype(int)
+    values['age_of_bldg'] = AGE_REFERENCE_YEAR - merged['year_completed'].astype(int)
+    values['town_index'] = (merged['bldg_contract_town'].map(TOWN_CODES).map(town_index)
+                            .fillna(BUILDING_DEFAULTS['town_index']))
+
+    return BuildingIndex(merged['Address Lat'], merged['Address Long'], values[BUILDING_COLUMNS].to_numpy())
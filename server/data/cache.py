@@ -0,0 +1,153 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class LocalBackend:
+    """In-process LRU with per-entry TTL."""
+
+    def __init__(self, max_entries, ttl_seconds):
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (value, time.monotonic() + self.ttl)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class RedisBackend:
+    """Shared across workers; eviction is left to Redis (e.g. maxmemory-policy allkeys-lru)."""
+
+    def __init__(self, url, ttl_seconds, prefix='rent:'):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl_seconds
+        self.prefix = prefix
+        self.evictions = 0
+
+    def _key(self, key):
+        return self.prefix + ':'.join(str(part) for part in key)
+
+    def get(self, key):
+        value = self.client.get(self._key(key))
+        return None if value is None else float(value)
+
+    def set(self, key, value):
+        self.client.set(self._key(key), value, ex=int(self.ttl))
+
+    def clear(self):
+        # Entries of older model versions are never read again and expire via TTL
+        pass
+
+    def __len__(self):
+        return 0
+
+
+class PredictionCache:
+    """Caches predictions keyed on quantised (addr_lat, addr_long, flat_type, area_sqft, month, year).
+
+    Predictions are computed from the quantised inputs, so every request that maps
+    to a key gets the same answer. Keys include the engine version, so entries are
+    dropped when the model artifacts change."""
+
+    def __init__(self, get_engine, backend, coord_decimals=4, area_step=1.0):
+        self.get_engine = get_engine
+        self.backend = backend
+        self.coord_decimals = coord_decimals
+        self.area_step = area_step
+        self.version = None
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def quantise(self, parsed):
+        addr_lat, addr_long, flat_type, area_sqft, month, year = parsed
+        if self.area_step:
+            area_sqft = round(area_sqft / self.area_step) * self.area_step
+        return (round(addr_lat, self.coord_decimals), round(addr_long, self.coord_decimals),
+                flat_type, float(area_sqft), month, year)
+
+    def key(self, quantised):
+        version = self.get_engine().version
+        if version != self.version:
+            with self.lock:
+                if version != self.version:
+                    self.backend.clear()
+                    self.version = version
+        return (version, *quantised)
+
+    def get(self, key):
+        value = self.backend.get(key)
+        with self.lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key, value):
+        self.backend.set(key, value)
+
+    def get_or_compute(self, parsed, compute):
+        quantised = self.quantise(parsed)
+        key = self.key(quantised)
+        value = self.get(key)
+        if value is None:
+            value = compute(quantised)
+            self.set(key, value)
+        return value
+
+    def stats(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / total if total else 0.0,
+                'size': len(self.backend),
+                'evictions': self.backend.evictions,
+                'version': self.version,
+            }
+
+
+def cache_from_env(get_engine):
+    # PREDICTION_CACHE=1 enables the cache; returns None otherwise
+    if os.environ.get('PREDICTION_CACHE', '0') != '1':
+        return None
+    ttl = float(os.environ.get('PREDICTION_CACHE_TTL', '3600'))
+    redis_url = os.environ.get('PREDICTION_CACHE_REDIS_URL')
+    if redis_url:
+        backend = RedisBackend(redis_url, ttl)
+    else:
+        backend = LocalBackend(int(os.environ.get('PREDICTION_CACHE_SIZE', '10000')), ttl)
+    return PredictionCache(get_engine, backend,
+                           coord_decimals=int(os.environ.get('PREDICTION_CACHE_COORD_DECIMALS', '4')),
+                           area_step=float(os.environ.get('PREDICTION_CACHE_AREA_STEP', '1')))
@@ -0,0 +1,115 @@
+import argparse
+import json
+
+import numpy as np
+import torch
+import torch.nn as nn
+
+from data.artifacts import file_sha256, MODEL_PATHS
+
+COMPILED_PATHS = {
+    'mlp': 'models/best_mlp.ts',
+    'tt': 'models/best_tt.ts',
+}
+# Compiled outputs (SGD rent) must match eager mode this closely
+PARITY_ATOL = 0.05
+PARITY_RTOL = 1e-5
+
+
+def fold_linear_bn(linear, bn):
+    # Eval-mode BatchNorm is an affine map, so it can be absorbed into the preceding Linear
+    scale = bn.weight / torch.sqrt(bn.running_var + bn.eps)
+    fused = nn.Linear(linear.in_features, linear.out_features)
+    with torch.no_grad():
+        fused.weight.copy_(linear.weight * scale[:, None])
+        fused.bias.copy_((linear.bias - bn.running_mean) * scale + bn.bias)
+    return fused
+
+
+def fold_mlp(mlp):
+    # Linear+BatchNorm pairs become one Linear; Dropout is a no-op in eval and is dropped
+    modules = list(mlp.net)
+    layers = []
+    i = 0
+    while i < len(modules):
+        m = modules[i]
+        if isinstance(m, nn.Linear) and i + 1 < len(modules) and isinstance(modules[i + 1], nn.BatchNorm1d):
+            layers.append(fold_linear_bn(m, modules[i + 1]))
+            i += 2
+            continue
+        if not isinstance(m, nn.Dropout):
+            layers.append(m)
+        i += 1
+    return nn.Sequential(*layers).eval()
+
+
+def example_inputs(prep, n, seed=0):
+    # Random inputs in the models' scaled/encoded space: (mlp input, tt numeric input, tt codes)
+    g = torch.Generator().manual_seed(seed)
+    x_num = torch.randn(n, len(prep.num_feats), generator=g)
+    codes = torch.stack([torch.randint(0, card, (n,), generator=g) for card in prep.cat_cards], dim=1)
+    x_cat = np.stack([prep.code_values[j][codes[:, j].numpy()] for j in range(len(prep.cat_cards))], axis=1)
+    x_mlp = torch.cat([x_num, torch.tensor(prep.one_hot(x_cat), dtype=torch.float32)], dim=1)
+    return x_mlp, x_num, codes
+
+
+def compile_models(mlp, tt, prep):
+    x_mlp, x_num, codes = example_inputs(prep, 8)
+    mlp_ts = torch.jit.freeze(torch.jit.script(fold_mlp(mlp)))
+    with torch.no_grad():
+        tt_ts = torch.jit.freeze(torch.jit.trace(tt.eval(), (x_num, *codes.unbind(1)), check_trace=False))
+    return mlp_ts, tt_ts
+
+
+def check_parity(mlp, tt, mlp_ts, tt_ts, prep):
+    # Returns the largest absolute difference per model over several batch sizes
+    worst = {'mlp': 0.0, 'tt': 0.0}
+    for seed, n in enumerate([1, 7, 256, 1000]):
+        x_mlp, x_num, codes = example_inputs(prep, n, seed=seed + 1)
+        with torch.no_grad():
+            pairs = {
+                'mlp': (mlp(x_mlp), mlp_ts(x_mlp)),
+                'tt': (tt(x_num, *codes.unbind(1)), tt_ts(x_num, *codes.unbind(1))),
+            }
+        for name, (eager, compiled) in pairs.items():
+            if not torch.allclose(eager, compiled, atol=PARITY_ATOL, rtol=PARITY_RTOL):
+                raise RuntimeError(f"{name} compiled output differs from eager mode "
+                                   f"(max abs diff {float((eager - compiled).abs().max()):.4f}, batch {n})")
+            worst[name] = max(worst[name], float((eager - compiled).abs().max()))
+    return worst
+
+
+def load_compiled(name, map_location='cpu', compiled_paths=COMPILED_PATHS, model_paths=MODEL_PATHS):
+    path = compiled_paths.get(name)
+    if path is None:
+        raise RuntimeError(f"No compiled {name} in this model bundle; run `python -m data.compiled` before publishing")
+    extra = {'source.json': ''}
+    model = torch.jit.load(path, map_location=map_location, _extra_files=extra)
+    source = json.loads(extra['source.json'])
+    if source['sha256'] != file_sha256(model_paths[name]):
+        raise RuntimeError(f"{path} was compiled from different weights than "
+                           f"{model_paths[name]}; re-run `python -m data.compiled`")
+    return model
+
+
+def export_compiled():
+    from data.infer import InferenceEngine
+
+    engine = InferenceEngine(backend='eager')
+    mlp, tt = engine.mlp.cpu(), engine.tt.cpu()
+    mlp_ts, tt_ts = compile_models(mlp, tt, engine.prep)
+    worst = check_parity(mlp, tt, mlp_ts, tt_ts, engine.prep)
+
+    for name, model in (('mlp', mlp_ts), ('tt', tt_ts)):
+        source = json.dumps({'sha256': file_sha256(MODEL_PATHS[name])})
+        torch.jit.save(model, COMPILED_PATHS[name], _extra_files={'source.json': source})
+    return worst
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Compile the MLP (BatchNorm folded) and TabTransformer to frozen TorchScript.')
+    parser.parse_args()
+    worst = export_compiled()
+    print(f"Wrote {', '.join(COMPILED_PATHS.values())}; max abs diff vs eager: "
+          f"mlp {worst['mlp']:.6f}, tt {worst['tt']:.6f}")
@@ -0,0 +1,378 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+import time
+
+import pandas as pd
+
+from data.artifacts import file_sha256
+from data.buildings import AGE_REFERENCE_YEAR, FLAG_COLUMNS, HDB_PROPERTY_PATH
+from data.location import ADDRESS_PATH, DISTANCE_COLUMNS, NAME_COLUMNS
+
+# Scripted version of 01_rent_data_initial.ipynb through 05_train_test_split.ipynb.
+# Intermediate stages are cached as Parquet here, so a new month of rent data only
+# cleans, merges and geocodes the rows that were not there last time.
+FEATURES_DIR = 'data/features'
+STATE_FILE = 'state.json'
+STATE_VERSION = 1
+RESALE_PATH = 'data/csvs/hdb_resale_2012_onwards.csv'
+# Outputs go here, not next to the files the server, the quantisation gate, bench.py and
+# data.tiles read, until they have been checked and the models retrained on them
+OUT_DIR = 'data/features/output'
+SERVED_DIR = 'data/csvs'
+
+# Amenity kind per entry of DISTANCE_COLUMNS, and the kinds whose nearest name is kept
+AMENITY_KINDS = ['mrt', 'mall', 'npc', 'school', 'green']
+NAMED_KINDS = dict(zip(['mrt', 'mall'], NAME_COLUMNS))
+
+# Group column -> key in feature_indices.json
+INDEX_GROUPS = {'town': 'town', 'Nearest MRT Station': 'mrt', 'Nearest Mall Name': 'mall',
+                'flat_model': 'flat_model'}
+
+FINAL_COLUMNS = ['monthly_rent', 'max_floor_lvl', *FLAG_COLUMNS, 'floor_area_sqm', 'age_of_bldg',
+                 *DISTANCE_COLUMNS, 'flat_type_int', 'flat_model_index', 'town_index', 'mrt_index',
+                 'mall_index']
+
+
+def _normalise(series):
+    return series.astype(str).str.strip().str.upper()
+
+
+def frame_digest(df):
+    # Content hash of a frame, row positions included
+    return hashlib.sha256(pd.util.hash_pandas_object(df, index=True).values.tobytes()).hexdigest()
+
+
+class FeatureStore:
+    """Stage cache under FEATURES_DIR: one Parquet partition of cleaned rent rows per
+    approval month, the resale floor areas, and amenity distances per block address.
+    state.json records what each stage was built from, so stale stages are redone."""
+
+    def __init__(self, root=FEATURES_DIR):
+        self.root = root
+        os.makedirs(os.path.join(root, 'rent'), exist_ok=True)
+        self.state = {'version': STATE_VERSION, 'sources': {}, 'months': {}, 'amenities': None}
+        path = os.path.join(root, STATE_FILE)
+        if os.path.exists(path):
+            with open(path) as f:
+                saved = json.load(f)
+            if saved.get('version') == STATE_VERSION:
+                self.state = saved
+
+    def path(self, name):
+        return os.path.join(self.root, name)
+
+    def month_path(self, month):
+        return os.path.join(self.root, 'rent', f'{month}.parquet')
+
+    def save(self):
+        tmp = self.path(STATE_FILE + '.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(self.state, f, indent=2)
+        os.replace(tmp, self.path(STATE_FILE))
+
+    def check_sources(self, sources):
+        # Every month partition embeds the property and resale merges, so a change to
+        # either source invalidates all of them
+        if self.state['sources'] != sources:
+            self.state['sources'] = sources
+            self.state['months'] = {}
+            if os.path.exists(self.path('resale_sqm.parquet')):
+                os.remove(self.path('resale_sqm.parquet'))
+
+
+def read_rent(paths):
+    raw = pd.concat([pd.read_csv(p, dtype={'block': str}) for p in paths], ignore_index=True)
+    # Approval dates are YYYY-MM; a few rows carry the placeholder year 0001
+    raw['approval_month'] = raw['rent_approval_date'].astype(str).str[:7]
+    return raw
+
+
+def load_properties(path=HDB_PROPERTY_PATH):
+    props = pd.read_csv(path, dtype={'blk_no': str})
+    props = props.rename(columns={'blk_no': 'block', 'street': 'street_name'})
+    props['block'] = _normalise(props['block'])
+    props['street_name'] = _normalise(props['street_name'])
+    return props
+
+
+def resale_floor_areas(store, resale_path=RESALE_PATH):
+    # Floor area and flat model per block, street and flat type, first seen in the resale data
+    cached = store.path('resale_sqm.parquet')
+    if os.path.exists(cached):
+        return pd.read_parquet(cached)
+
+    cols = ['block', 'street_name', 'flat_type', 'floor_area_sqm', 'flat_model']
+    sqm = pd.read_csv(resale_path, usecols=cols, dtype={'block': str})[cols]
+    sqm = sqm.drop_duplicates(subset=cols, keep='first')
+    sqm = sqm[sqm['flat_type'] != 'MULTI-GENERATION'].copy()
+    sqm['flat_type'] = sqm['flat_type'].str.replace(' ', '-', regex=False)
+    sqm['block'] = _normalise(sqm['block'])
+    sqm['street_name'] = _normalise(sqm['street_name'])
+    sqm = sqm.drop_duplicates(subset=['block', 'street_name', 'flat_type'], keep='first')
+    sqm.to_parquet(cached, index=False)
+    return sqm
+
+
+def clean_rent(raw, props, sqm):
+    # 01_rent_data_initial.ipynb, vectorised over one batch of raw rows
+    data = raw.copy()
+    # Position in the inputs; merges renumber rows, and the splits depend on row order
+    data['source_row'] = data.index
+    data['rent_approval_year'] = data['rent_approval_date'].astype(str).str[:4].astype(int)
+    data['rent_approval_mth'] = data['rent_approval_date'].astype(str).str[5:7].astype(int)
+    data['block'] = _normalise(data['block'])
+    data['street_name'] = _normalise(data['street_name'])
+
+    merged = data.merge(props, on=['block', 'street_name'], how='left')
+    merged = merged[merged['town'] != 'TENGAH']
+    merged = merged.merge(sqm, on=['block', 'street_name', 'flat_type'], how='left').dropna()
+    merged['year_completed'] = merged['year_completed'].astype(int)
+    merged['age_of_bldg'] = AGE_REFERENCE_YEAR - merged['year_completed']
+    # 03_combining_datasets.ipynb drops the placeholder year
+    merged = merged[merged['rent_approval_year'] != 1]
+    merged['address'] = merged['block'] + ' ' + merged['street_name']
+    return merged
+
+
+def update_rent(store, raw, props, sqm):
+    # Re-cleans only the months whose raw rows differ from the cached partition
+    processed, reused = [], []
+    for month, rows in raw.groupby('approval_month', sort=True):
+        digest = frame_digest(rows.drop(columns='approval_month'))
+        path = store.month_path(month)
+        if store.state['months'].get(month) == digest and os.path.exists(path):
+            reused.append(month)
+            continue
+        clean_rent(rows, props, sqm).to_parquet(path, index=False)
+        store.state['months'][month] = digest
+        processed.append(month)
+
+    # Months no longer in the inputs are dropped
+    for month in set(store.state['months']) - set(raw['approval_month']):
+        del store.state['months'][month]
+        if os.path.exists(store.month_path(month)):
+            os.remove(store.month_path(month))
+    return processed, reused
+
+
+def geocode_addresses(queries, address_path=ADDRESS_PATH):
+    # New blocks are searched on OneMap and appended to address_data.csv, which the
+    # server's building index also reads
+    from data.geocode import CACHE_PATH, GeocodeCache, Geocoder, address_table
+
+    async def run():
+        cache = GeocodeCache(CACHE_PATH)
+        try:
+            async with Geocoder(cache) as geocoder:
+                return await geocoder.search_many(queries)
+        finally:
+            cache.close()
+
+    results = asyncio.run(run())
+    failed = [q for q, r in zip(queries, results) if isinstance(r, Exception)]
+    ok = [(q, r) for q, r in zip(queries, results) if not isinstance(r, Exception)]
+    found = address_table([q for q, _ in ok], [r for _, r in ok])
+    if len(found):
+        found.to_csv(address_path, mode='a', header=not os.path.exists(address_path), index=False)
+    return len(found), failed
+
+
+def amenity_distances(amenities, lats, longs):
+    # One BallTree query per amenity kind over every address at once
+    out = {}
+    for kind, dist_col in zip(AMENITY_KINDS, DISTANCE_COLUMNS):
+        names, dists = amenities[kind].query_batch(lats, longs)
+        out[dist_col] = dists
+        if kind in NAMED_KINDS:
+            out[NAMED_KINDS[kind]] = names
+    return pd.DataFrame(out)
+
+
+def update_amenities(store, addresses, csv_dir=SERVED_DIR):
+    # Distances per geocoded block address (02_amenities_data.ipynb), computed only for
+    # addresses not cached yet, or for all of them when an amenity table changed. The
+    # amenity tables are inputs, read from where data.geocode writes them.
+    from data.spatial import amenity_digest, load_amenity_indexes
+
+    digest = amenity_digest(csv_dir)
+    cached_path = store.path('amenities.parquet')
+    cached = None
+    if os.path.exists(cached_path) and store.state['amenities'] == digest:
+        cached = pd.read_parquet(cached_path)
+
+    # As in 03_combining_datasets.ipynb, rows join on the address OneMap returned
+    addresses = addresses.drop_duplicates('Address')
+    if cached is not None:
+        addresses = addresses[~addresses['Address'].isin(cached['Address'])]
+    if len(addresses):
+        lats = addresses['Address Lat'].astype(float).to_numpy()
+        longs = addresses['Address Long'].astype(float).to_numpy()
+        computed = pd.concat([addresses[['Address', 'Address Lat', 'Address Long']].reset_index(drop=True),
+                              amenity_distances(load_amenity_indexes(csv_dir), lats, longs)], axis=1)
+        cached = computed if cached is None else pd.concat([cached, computed], ignore_index=True)
+        cached.to_parquet(cached_path, index=False)
+        store.state['amenities'] = digest
+    return cached, len(addresses)
+
+
+def build_indices(df):
+    # Median monthly rent per group, min-max scaled to [0, 1] over the groups; this is
+    # how the town/mrt/mall/flat_model indices shipped in feature_indices.json relate
+    # to the rent data (e.g. town steps of 1/11 between medians $50 apart)
+    indices = {}
+    for col, key in INDEX_GROUPS.items():
+        medians = df.groupby(col)['monthly_rent'].median()
+        span = medians.max() - medians.min()
+        scaled = (medians - medians.min()) / span if span else medians * 0.0
+        indices[key] = {str(k): float(v) for k, v in scaled.sort_values(ascending=False).items()}
+    return indices
+
+
+def assemble(store, amenities):
+    from data.records import flat_type_to_int
+
+    months = sorted(store.state['months'])
+    rent = pd.concat([pd.read_parquet(store.month_path(m)) for m in months], ignore_index=True)
+    # Back in input order, so the random split matches a run over the same files
+    rent = rent.sort_values('source_row', kind='stable')
+    combined = rent.merge(amenities.drop(columns=['Address Lat', 'Address Long']),
+                          left_on='address', right_on='Address', how='inner')
+
+    indices = build_indices(combined)
+    df = combined.copy()
+    for c in FLAG_COLUMNS:
+        df[c] = (df[c] == 'Y').astype(int)
+    df['max_floor_lvl'] = df['max_floor_lvl'].astype(float)
+    df['flat_type_int'] = df['flat_type'].map(flat_type_to_int)
+    df['flat_model_index'] = df['flat_model'].map(indices['flat_model'])
+    df['town_index'] = df['town'].map(indices['town'])
+    df['mrt_index'] = df['Nearest MRT Station'].map(indices['mrt'])
+    df['mall_index'] = df['Nearest Mall Name'].map(indices['mall'])
+
+    years = pd.get_dummies(df['rent_approval_year'], prefix='year', dtype=int)
+    months_oh = pd.get_dummies(df['rent_approval_mth'], prefix='month', dtype=int)
+    months_oh = months_oh.reindex(columns=[f'month_{m}' for m in range(1, 13)], fill_value=0)
+    final = pd.concat([df[FINAL_COLUMNS], years, months_oh], axis=1).reset_index(drop=True)
+    return final, indices
+
+
+def split(final, test_year=None, seed=42):
+    # 05_train_test_split.ipynb: the latest year held out, and a random 80/20 split
+    from sklearn.model_selection import train_test_split
+
+    year_cols = sorted(c for c in final.columns if c.startswith('year_'))
+    test_year = test_year or int(year_cols[-1][5:])
+    is_test = final[f'year_{test_year}'] == 1
+    random_train, random_test = train_test_split(final, test_size=0.2, random_state=seed)
+    return {'df_train': final[~is_test], 'df_test': final[is_test],
+            'df_random_train': random_train, 'df_random_test': random_test}
+
+
+def check_indices(index_path, indices):
+    # Refuses to replace the served indices with different ones
+    from data.infer import INDEX_PATH
+
+    if os.path.realpath(index_path) == os.path.realpath(INDEX_PATH) and os.path.exists(index_path):
+        with open(index_path) as f:
+            current = json.load(f)
+        if any(indices.get(key) != values for key, values in current.items()):
+            raise ValueError(f'The regenerated indices differ from the ones in {index_path}, which the '
+                             f'deployed models were trained with; pass --overwrite to replace them')
+
+
+def write_indices(indices, path):
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(indices, f, indent=1)
+    os.replace(tmp, path)
+
+
+def run(rent_paths, resale_path=RESALE_PATH, out_dir=OUT_DIR, root=FEATURES_DIR, geocode=False,
+        rebuild=False, test_year=None, index_path=None, overwrite=False,
+        property_path=HDB_PROPERTY_PATH, address_path=ADDRESS_PATH, amenity_dir=SERVED_DIR):
+    index_path = index_path or os.path.join(out_dir, 'feature_indices.json')
+    if not overwrite and os.path.realpath(out_dir) == os.path.realpath(SERVED_DIR):
+        raise ValueError(f'{out_dir} holds the CSVs the server and its checks read; '
+                         f'pass --overwrite to replace them')
+    if rebuild:
+        shutil.rmtree(root, ignore_errors=True)
+    store = FeatureStore(root)
+    store.check_sources({'property': file_sha256(property_path), 'resale': file_sha256(resale_path)})
+    report = {}
+
+    start = time.perf_counter()
+    props = load_properties(property_path)
+    sqm = resale_floor_areas(store, resale_path)
+    raw = read_rent(rent_paths)
+    report['processed'], report['reused'] = update_rent(store, raw, props, sqm)
+    report['rent_s'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    rent_addresses = pd.concat([pd.read_parquet(store.month_path(m), columns=['address'])
+                                for m in store.state['months']])['address'].unique()
+    if os.path.exists(address_path):
+        known = pd.read_csv(address_path)
+    else:
+        known = pd.DataFrame(columns=['Search Name', 'Address', 'Address Lat', 'Address Long'])
+    missing = sorted(set(rent_addresses) - set(_normalise(known['Search Name'])) - set(known['Address']))
+    report['geocoded'], report['ungeocoded'] = 0, len(missing)
+    if missing and geocode:
+        report['geocoded'], failed = geocode_addresses(missing, address_path)
+        report['ungeocoded'] = len(failed)
+        if os.path.exists(address_path):
+            known = pd.read_csv(address_path)
+    if not len(known):
+        raise ValueError(f'No geocoded block addresses in {address_path}; run with --geocode')
+    amenities, report['new_addresses'] = update_amenities(store, known, amenity_dir)
+    report['amenities_s'] = time.perf_counter() - start
+    store.save()
+
+    start = time.perf_counter()
+    final, indices = assemble(store, amenities)
+    if not len(final):
+        raise ValueError(f'No rent rows matched a geocoded address in {address_path}; run with --geocode')
+    if not overwrite:
+        check_indices(index_path, indices)
+    frames = {'df_final': final, **split(final, test_year)}
+    os.makedirs(out_dir, exist_ok=True)
+    for name, df in frames.items():
+        df.to_csv(os.path.join(out_dir, f'{name}.csv'), index=False)
+    write_indices(indices, index_path)
+    report['assemble_s'] = time.perf_counter() - start
+    report['rows'] = {name: len(df) for name, df in frames.items()}
+    report['indices'] = {key: len(v) for key, v in indices.items()}
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Build the training features (df_final and its splits) and feature_indices.json '
+                    'from the raw rent data, reprocessing only months that changed since the last run.')
+    parser.add_argument('rent', nargs='+', help='RentingOutofFlats CSVs (the full history, or several files)')
+    parser.add_argument('--resale', default=RESALE_PATH)
+    parser.add_argument('--out-dir', default=OUT_DIR)
+    parser.add_argument('--cache-dir', default=FEATURES_DIR)
+    parser.add_argument('--indices', help='where to write the indices (default: feature_indices.json in --out-dir)')
+    parser.add_argument('--test-year', type=int, help='year held out in df_test (default: the latest)')
+    parser.add_argument('--geocode', action='store_true', help='search OneMap for blocks not in address_data.csv')
+    parser.add_argument('--rebuild', action='store_true', help='discard the stage cache and start over')
+    parser.add_argument('--overwrite', action='store_true',
+                        help=f'allow replacing the CSVs in {SERVED_DIR} and the indices the server loads')
+    args = parser.parse_args()
+
+    report = run(args.rent, args.resale, args.out_dir, args.cache_dir, args.geocode, args.rebuild,
+                 args.test_year, args.indices, args.overwrite)
+    print(f"rent: {len(report['processed'])} months processed, {len(report['reused'])} reused "
+          f"({report['rent_s']:.1f}s)")
+    print(f"amenities: {report['geocoded']} blocks geocoded, {report['new_addresses']} new addresses "
+          f"({report['amenities_s']:.1f}s)")
+    if report['ungeocoded']:
+        print(f"{report['ungeocoded']} block addresses have no coordinates; their rows are left out "
+              f"(rerun with --geocode)")
+    print(', '.join(f"{name}: {rows} rows" for name, rows in report['rows'].items())
+          + f" ({report['assemble_s']:.1f}s)")
+    print(f"indices: {', '.join(f'{k} {n}' for k, n in report['indices'].items())}")
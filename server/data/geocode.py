@@ -0,0 +1,261 @@
+import argparse
+import asyncio
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+
+import aiohttp
+import pandas as pd
+
+# Point at a local stand-in server with ONEMAP_BASE_URL or --base-url
+ONEMAP_BASE_URL = os.environ.get('ONEMAP_BASE_URL', 'https://www.onemap.gov.sg')
+SEARCH_PATH = '/api/common/elastic/search'
+# Search strings per amenity table, as listed in 02_amenities_data.ipynb
+QUERIES_PATH = 'data/csvs/amenity_queries.json'
+CACHE_PATH = 'data/csvs/geocode_cache.sqlite'
+
+CONCURRENCY = 8
+# OneMap allows about 250 calls a minute
+RATE_PER_SECOND = 4.0
+MAX_RETRIES = 4
+BACKOFF_SECONDS = 0.5
+TIMEOUT_SECONDS = 10.0
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class GeocodeCache:
+    """First search result per query string (None for no match), in SQLite so an
+    interrupted or repeated build only calls the API for queries it has not seen."""
+
+    def __init__(self, path=CACHE_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('CREATE TABLE IF NOT EXISTS geocode (query TEXT PRIMARY KEY, result TEXT)')
+        self.conn.commit()
+
+    def get(self, query):
+        # (found in cache, result)
+        with self.lock:
+            row = self.conn.execute('SELECT result FROM geocode WHERE query = ?', (query,)).fetchone()
+        if row is None:
+            return False, None
+        return True, json.loads(row[0])
+
+    def set(self, query, result):
+        with self.lock:
+            self.conn.execute('INSERT OR REPLACE INTO geocode VALUES (?, ?)', (query, json.dumps(result)))
+            self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+
+class RateLimiter:
+    """Spaces request starts at least 1 / rate seconds apart."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0.0
+        self.next_at = 0.0
+        self.lock = asyncio.Lock()
+
+    async def wait(self):
+        async with self.lock:
+            now = time.monotonic()
+            delay = self.next_at - now
+            self.next_at = max(now, self.next_at) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+def retry_after_seconds(value):
+    # Retry-After may also be an HTTP-date; anything but a number falls back to the backoff
+    try:
+        seconds = float(value)
+    except (TypeError, ValueError):
+        return 0.0
+    return seconds if math.isfinite(seconds) and seconds > 0 else 0.0
+
+
+class RetryableError(Exception):
+    def __init__(self, message, retry_after=0.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class Geocoder:
+    """OneMap search with bounded concurrency over one pooled session, rate limiting,
+    retries with exponential backoff, and an on-disk cache. Use as `async with`."""
+
+    def __init__(self, cache, base_url=ONEMAP_BASE_URL, concurrency=CONCURRENCY,
+                 rate=RATE_PER_SECOND, max_retries=MAX_RETRIES):
+        self.cache = cache
+        self.url = base_url.rstrip('/') + SEARCH_PATH
+        self.concurrency = concurrency
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.limiter = RateLimiter(rate)
+        self.max_retries = max_retries
+        self.session = None
+        self.stats = {'cache_hits': 0, 'requests': 0, 'retries': 0, 'failures': 0}
+
+    async def __aenter__(self):
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.concurrency),
+            timeout=aiohttp.ClientTimeout(total=TIMEOUT_SECONDS))
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.session.close()
+
+    async def search(self, query):
+        # First result dict, or None when OneMap has no match; raises after max_retries failures
+        cached, result = self.cache.get(query)
+        if cached:
+            self.stats['cache_hits'] += 1
+            return result
+
+        params = {'searchVal': query, 'returnGeom': 'Y', 'getAddrDetails': 'Y', 'pageNum': '1'}
+        async with self.semaphore:
+            for attempt in range(self.max_retries + 1):
+                await self.limiter.wait()
+                self.stats['requests'] += 1
+                try:
+                    async with self.session.get(self.url, params=params) as resp:
+                        if resp.status in RETRY_STATUSES:
+                            raise RetryableError(f'HTTP {resp.status}',
+                                                 retry_after_seconds(resp.headers.get('Retry-After')))
+                        resp.raise_for_status()
+                        data = await resp.json(content_type=None)
+                    break
+                except (RetryableError, aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                    if attempt == self.max_retries:
+                        self.stats['failures'] += 1
+                        raise RuntimeError(f'Geocoding {query!r} failed after {attempt + 1} attempts: {e}') from e
+                    self.stats['retries'] += 1
+                    await asyncio.sleep(max(getattr(e, 'retry_after', 0), BACKOFF_SECONDS * 2 ** attempt))
+
+        result = data['results'][0] if data.get('found') else None
+        self.cache.set(query, result)
+        return result
+
+    async def search_many(self, queries):
+        # Results in query order; failed queries come back as exceptions
+        return await asyncio.gather(*(self.search(q) for q in queries), return_exceptions=True)
+
+
+def _lat_long(results):
+    return ([float(r['LATITUDE']) if r else None for r in results],
+            [float(r['LONGITUDE']) if r else None for r in results])
+
+
+def mrt_table(queries, results):
+    lats, longs = _lat_long(results)
+    df = pd.DataFrame({'Station Name': [r['BUILDING'] if r else 'Not Found' for r in results],
+                       'Station Lat': lats, 'Station Long': longs})
+    return df[df['Station Name'] != 'Not Found']
+
+
+def mall_table(queries, results):
+    lats, longs = _lat_long(results)
+    df = pd.DataFrame({'Mall Name': [r['BUILDING'] if r else 'Not Found' for r in results],
+                       'Mall Lat': lats, 'Mall Long': longs})
+    df = df[df['Mall Name'] != 'Not Found'].copy()
+    for bank in ('DBS', 'OCBC', 'UOB'):
+        df['Mall Name'] = df['Mall Name'].str.replace(bank, '')
+    return df
+
+
+def named_table(name_col, lat_col, long_col):
+    # Tables keyed on the search string itself (NPCs, schools, green areas)
+    def build(queries, results):
+        lats, longs = _lat_long(results)
+        df = pd.DataFrame({name_col: queries, lat_col: lats, long_col: longs})
+        return df[[r is not None for r in results]]
+    return build
+
+
+# Table name -> (output csv, row builder, search on the upper-cased name)
+TABLES = {
+    'mrt': ('mrt_data.csv', mrt_table, False),
+    'mall': ('mall_data.csv', mall_table, False),
+    'npc': ('npc_data.csv', named_table('NPC', 'NPC Lat', 'NPC Long'), False),
+    'school': ('school_data.csv', named_table('Search Name', 'School Lat', 'School Long'), True),
+    'green': ('green_data.csv', named_table('Green Area', 'Green Lat', 'Green Long'), False),
+}
+
+
+def address_queries(rent_csv):
+    df = pd.read_csv(rent_csv, usecols=['block', 'street_name'])
+    return (df['block'].astype(str) + ' ' + df['street_name'].astype(str)).unique().tolist()
+
+
+def address_table(queries, results):
+    lats, longs = _lat_long(results)
+    df = pd.DataFrame({'Search Name': queries,
+                       'Address': [f"{r['BLK_NO']} {r['ROAD_NAME']}" if r else 'Not Found' for r in results],
+                       'Address Lat': lats, 'Address Long': longs})
+    return df[df['Address'] != 'Not Found']
+
+
+async def build_tables(tables, out_dir='data/csvs', rent_csv=None, base_url=ONEMAP_BASE_URL,
+                       concurrency=CONCURRENCY, rate=RATE_PER_SECOND, cache_path=CACHE_PATH):
+    # Geocodes every query of the requested tables concurrently and writes the *_data.csv
+    # files; nothing is written for a table with failed queries (rerun to retry them)
+    with open(QUERIES_PATH) as f:
+        all_queries = json.load(f)
+
+    jobs = {}
+    for name in tables:
+        csv, builder, upper = TABLES[name]
+        jobs[name] = (csv, builder, all_queries[name], [q.upper() if upper else q for q in all_queries[name]])
+    if rent_csv:
+        queries = address_queries(rent_csv)
+        jobs['address'] = ('address_data.csv', address_table, queries, queries)
+
+    cache = GeocodeCache(cache_path)
+    try:
+        async with Geocoder(cache, base_url, concurrency, rate) as geocoder:
+            results = await asyncio.gather(*(geocoder.search_many(search) for _, _, _, search in jobs.values()))
+            stats = dict(geocoder.stats)
+    finally:
+        cache.close()
+
+    written, failed = {}, {}
+    for (name, (csv, builder, queries, _)), found in zip(jobs.items(), results):
+        errors = [r for r in found if isinstance(r, Exception)]
+        if errors:
+            failed[name] = errors
+            continue
+        df = builder(queries, found)
+        path = os.path.join(out_dir, csv)
+        df.to_csv(path, index=False)
+        written[name] = (path, len(df), len(queries))
+    return written, failed, stats
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Geocode amenities (and optionally HDB blocks) into data/csvs.')
+    parser.add_argument('--tables', nargs='+', choices=list(TABLES), default=list(TABLES))
+    parser.add_argument('--addresses', metavar='RENT_CSV',
+                        help='also geocode every block + street_name in this file into address_data.csv')
+    parser.add_argument('--out-dir', default='data/csvs')
+    parser.add_argument('--base-url', default=ONEMAP_BASE_URL)
+    parser.add_argument('--concurrency', type=int, default=CONCURRENCY)
+    parser.add_argument('--rate', type=float, default=RATE_PER_SECOND, help='requests per second (0: unlimited)')
+    parser.add_argument('--cache', default=CACHE_PATH)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    written, failed, stats = asyncio.run(build_tables(
+        args.tables, args.out_dir, args.addresses, args.base_url, args.concurrency, args.rate, args.cache))
+    for name, (path, rows, queries) in written.items():
+        print(f"{name}: {rows}/{queries} found -> {path}")
+    for name, errors in failed.items():
+        print(f"{name}: {len(errors)} queries failed, not written (e.g. {errors[0]})")
+    print(f"{stats['requests']} requests, {stats['cache_hits']} cache hits, {stats['retries']} retries "
+          f"in {time.perf_counter() - start:.1f}s")
+    if failed:
+        raise SystemExit(1)
@@ -0,0 +1,179 @@
+import argparse
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+LOCATION_FEATURES_PATH = 'data/csvs/location_features.csv'
+CLIENT_STATIONS_PATH = '../client_vite/AI-Assignment/src/mrt_lrt_data.csv'
+# Geocoded HDB blocks written by 02_amenities_data.ipynb
+ADDRESS_PATH = 'data/csvs/address_data.csv'
+
+DISTANCE_COLUMNS = ['Nearest MRT Distance', 'Nearest Mall Distance', 'Nearest NPC Distance',
+                    'Nearest School Distance', 'Nearest Green Area Distance']
+NAME_COLUMNS = ['Nearest MRT Station', 'Nearest Mall Name']
+LOCATION_COLUMNS = DISTANCE_COLUMNS + ['mrt_index', 'mall_index'] + NAME_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+
+def source_path(path):
+    # Sidecar recording which amenity tables a saved feature file was computed from
+    return os.path.splitext(path)[0] + '.source.json'
+
+
+class LocationFeatures:
+    """Memoises the lat/long-only feature block (the five amenity distances, the
+    nearest MRT and mall, and their mrt_index/mall_index) per snapped coordinate.
+
+    Precomputed locations are kept permanently; others go into a bounded LRU."""
+
+    def __init__(self, amenities, mrt_index, mall_index, decimals=6, max_entries=100000):
+        self.amenities = amenities
+        self.mrt_index = mrt_index
+        self.mall_index = mall_index
+        self.decimals = decimals
+        self.max_entries = max_entries
+        self.known = {}
+        self.recent = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def snap(self, lats, longs):
+        lats = np.round(np.asarray(lats, dtype=np.float64), self.decimals)
+        longs = np.round(np.asarray(longs, dtype=np.float64), self.decimals)
+        return lats, longs
+
+    def compute(self, lats, longs):
+        # Uncached geometry, one row tuple per location in LOCATION_COLUMNS order
+        n_mrt, d_mrt = self.amenities['mrt'].query_batch(lats, longs)
+        n_mall, d_mall = self.amenities['mall'].query_batch(lats, longs)
+        _, d_npc = self.amenities['npc'].query_batch(lats, longs)
+        _, d_school = self.amenities['school'].query_batch(lats, longs)
+        _, d_green = self.amenities['green'].query_batch(lats, longs)
+        return [self._row(dists, name_mrt, name_mall)
+                for dists, name_mrt, name_mall in zip(zip(d_mrt, d_mall, d_npc, d_school, d_green), n_mrt, n_mall)]
+
+    def _row(self, dists, n_mrt, n_mall):
+        # NaN index where the nearest station/mall has none
+        return (*(float(d) for d in dists), self.mrt_index.get(n_mrt, np.nan),
+                self.mall_index.get(n_mall, np.nan), n_mrt, n_mall)
+
+    def lookup(self, lats, longs):
+        lats, longs = self.snap(lats, longs)
+        keys = list(zip(lats.tolist(), longs.tolist()))
+        rows = [None] * len(keys)
+        missing = {}
+        with self.lock:
+            for i, key in enumerate(keys):
+                row = self.known.get(key)
+                if row is None:
+                    row = self.recent.get(key)
+                    if row is not None:
+                        self.recent.move_to_end(key)
+                if row is None:
+                    missing.setdefault(key, []).append(i)
+                else:
+                    rows[i] = row
+            self.hits += len(keys) - sum(len(positions) for positions in missing.values())
+            self.misses += sum(len(positions) for positions in missing.values())
+
+        if missing:
+            missing_keys = list(missing)
+            computed = self.compute([key[0] for key in missing_keys], [key[1] for key in missing_keys])
+            with self.lock:
+                for key, row in zip(missing_keys, computed):
+                    self.recent[key] = row
+                while len(self.recent) > self.max_entries:
+                    self.recent.popitem(last=False)
+            for key, row in zip(missing_keys, computed):
+                for i in missing[key]:
+                    rows[i] = row
+
+        return pd.DataFrame.from_records(rows, columns=LOCATION_COLUMNS)
+
+    def precompute(self, lats, longs):
+        lats, longs = self.snap(lats, longs)
+        keys = set(zip(lats.tolist(), longs.tolist()))
+        keys = [key for key in keys if key not in self.known]
+        if keys:
+            rows = self.compute([key[0] for key in keys], [key[1] for key in keys])
+            with self.lock:
+                self.known.update(zip(keys, rows))
+        return len(keys)
+
+    def save(self, path=LOCATION_FEATURES_PATH, csv_dir='data/csvs'):
+        # Indices are not stored; they are re-derived on load from the current index tables
+        from data.spatial import amenity_digest
+
+        with self.lock:
+            items = list(self.known.items())
+        df = pd.DataFrame([(*key, *row) for key, row in items], columns=['lat', 'long'] + LOCATION_COLUMNS)
+        df.drop(columns=['mrt_index', 'mall_index']).to_csv(path, index=False)
+        with open(source_path(path), 'w') as f:
+            json.dump({'amenity_sha256': amenity_digest(csv_dir)}, f)
+
+    def load(self, path=LOCATION_FEATURES_PATH, csv_dir='data/csvs'):
+        # Skipped (returning 0) when the amenity tables changed since the file was saved
+        from data.spatial import amenity_digest
+
+        saved = None
+        if os.path.exists(source_path(path)):
+            with open(source_path(path)) as f:
+                saved = json.load(f).get('amenity_sha256')
+        if saved != amenity_digest(csv_dir):
+            logger.warning("%s was computed from other amenity tables than those in %s; ignoring it "
+                           "(rerun `python -m data.location`)", path, csv_dir)
+            return 0
+
+        df = pd.read_csv(path)
+        known = {}
+        for rec in zip(df['lat'], df['long'], *(df[c] for c in DISTANCE_COLUMNS + NAME_COLUMNS)):
+            key = (round(rec[0], self.decimals), round(rec[1], self.decimals))
+            known[key] = self._row(rec[2:7], rec[7], rec[8])
+        with self.lock:
+            self.known.update(known)
+        return len(known)
+
+    def stats(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / total if total else 0.0,
+                'precomputed': len(self.known),
+                'recent': len(self.recent),
+            }
+
+
+def known_locations():
+    # Every station the client offers, plus every geocoded HDB block if available
+    stations = pd.read_csv(CLIENT_STATIONS_PATH)
+    lats, longs = list(stations['lat']), list(stations['lng'])
+    if os.path.exists(ADDRESS_PATH):
+        blocks = pd.read_csv(ADDRESS_PATH)
+        lats += list(blocks['Address Lat'])
+        longs += list(blocks['Address Long'])
+    else:
+        print(f"{ADDRESS_PATH} not found; precomputing client stations only")
+    return lats, longs
+
+
+if __name__ == '__main__':
+    from data.infer import mrt_index_all, mall_index_all
+    from data.spatial import load_amenity_indexes
+
+    parser = argparse.ArgumentParser(description='Precompute amenity features for known locations.')
+    parser.add_argument('--out', default=LOCATION_FEATURES_PATH)
+    args = parser.parse_args()
+
+    locations = LocationFeatures(load_amenity_indexes(), mrt_index_all, mall_index_all)
+    count = locations.precompute(*known_locations())
+    locations.save(args.out)
+    print(f"Wrote {count} locations to {args.out}")
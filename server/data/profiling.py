@@ -0,0 +1,61 @@
+import contextlib
+import threading
+from time import perf_counter
+
+from data.metrics import STAGE_SECONDS
+
+_local = threading.local()
+
+
+@contextlib.contextmanager
+def profile():
+    # Collects {stage: seconds} for the engine work done inside the block on this thread
+    stages = {}
+    previous = getattr(_local, 'stages', None)
+    _local.stages = stages
+    try:
+        yield stages
+    finally:
+        _local.stages = previous
+        # Nested profiles also count towards the enclosing one
+        if previous is not None:
+            for name, seconds in stages.items():
+                previous[name] = previous.get(name, 0.0) + seconds
+
+
+class stage:
+    """Times a named pipeline stage into the stage histogram and the active profile(), if any."""
+
+    __slots__ = ('name', 'stages', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.stages = getattr(_local, 'stages', None)
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = perf_counter() - self.start
+        STAGE_SECONDS.observe(elapsed, stage=self.name)
+        if self.stages is not None:
+            self.stages[self.name] = self.stages.get(self.name, 0.0) + elapsed
+        return False
+
+
+class MovingAverages:
+    """Exponentially weighted averages of named values, e.g. per-stage seconds of
+    recent single predictions; cheap enough to update on every request."""
+
+    def __init__(self, alpha=0.05):
+        self.alpha = alpha
+        self.values = {}
+
+    def update(self, values):
+        for name, value in values.items():
+            prev = self.values.get(name)
+            self.values[name] = value if prev is None else prev + self.alpha * (value - prev)
+
+    def get(self, name, default=0.0):
+        return self.values.get(name, default)
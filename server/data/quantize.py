@@ -0,0 +1,95 @@
+import argparse
+import io
+import os
+import time
+
+import numpy as np
+import torch
+import torch.nn as nn
+
+from data.artifacts import load_training_frame
+from data.compiled import fold_mlp
+
+TEST_CSV = 'data/csvs/df_test.csv'
+# Largest allowed increase in test-set MAE (SGD) before int8 is refused
+MAX_MAE_DRIFT = float(os.environ.get('QUANTIZE_MAX_MAE_DRIFT', '10'))
+# Single-row calls timed for the latency figures
+LATENCY_SAMPLES = 200
+
+
+def quantize_dynamic_int8(mlp, tt):
+    # BatchNorm is folded first so every MLP layer is a quantisable Linear
+    mlp_q = torch.ao.quantization.quantize_dynamic(fold_mlp(mlp), {nn.Linear}, dtype=torch.qint8)
+    tt_q = torch.ao.quantization.quantize_dynamic(tt, {nn.Linear}, dtype=torch.qint8)
+    return mlp_q.eval(), tt_q.eval()
+
+
+def model_bytes(model):
+    buf = io.BytesIO()
+    torch.save(model.state_dict(), buf)
+    return buf.tell()
+
+
+def evaluate(engine, df):
+    from data.infer import TARGET
+
+    start = time.perf_counter()
+    preds = engine.predict_frame(df)
+    batch_seconds = time.perf_counter() - start
+
+    single = []
+    for i in range(min(LATENCY_SAMPLES, len(df))):
+        start = time.perf_counter()
+        engine.predict_frame(df.iloc[i:i+1])
+        single.append(time.perf_counter() - start)
+
+    return {
+        'mae': float(np.mean(np.abs(preds - df[TARGET].values))),
+        'batch_ms_per_row': 1000.0 * batch_seconds / len(df),
+        'single_p50_ms': 1000.0 * float(np.median(single)),
+        'model_bytes': model_bytes(engine.mlp) + model_bytes(engine.tt),
+    }
+
+
+def apply_quantization(engine, max_mae_drift=MAX_MAE_DRIFT, test_csv=TEST_CSV):
+    # Swaps int8 MLP/TabTransformer into the engine only if test MAE stays within max_mae_drift
+    if engine.backend != 'eager' or next(engine.mlp.parameters()).device.type != 'cpu':
+        raise ValueError('int8 dynamic quantisation needs the eager backend on CPU')
+
+    df = load_training_frame(test_csv)
+    fp32 = evaluate(engine, df)
+
+    mlp, tt = engine.mlp, engine.tt
+    engine.mlp, engine.tt = quantize_dynamic_int8(mlp, tt)
+    int8 = evaluate(engine, df)
+
+    drift = int8['mae'] - fp32['mae']
+    activated = drift <= max_mae_drift
+    if not activated:
+        engine.mlp, engine.tt = mlp, tt
+
+    return {
+        'activated': activated,
+        'mae_drift': drift,
+        'max_mae_drift': max_mae_drift,
+        'fp32': fp32,
+        'int8': int8,
+    }
+
+
+if __name__ == '__main__':
+    from data.infer import InferenceEngine
+
+    parser = argparse.ArgumentParser(description='Score int8 dynamic quantisation of the neural models against df_test.csv.')
+    parser.add_argument('--max-mae-drift', type=float, default=MAX_MAE_DRIFT)
+    args = parser.parse_args()
+
+    report = apply_quantization(InferenceEngine(backend='eager'), args.max_mae_drift)
+    fp32, int8 = report['fp32'], report['int8']
+    print(f"{'':<20}{'fp32':>12}{'int8':>12}")
+    print(f"{'MAE (SGD)':<20}{fp32['mae']:>12.2f}{int8['mae']:>12.2f}")
+    print(f"{'batch ms/row':<20}{fp32['batch_ms_per_row']:>12.4f}{int8['batch_ms_per_row']:>12.4f}")
+    print(f"{'single p50 ms':<20}{fp32['single_p50_ms']:>12.3f}{int8['single_p50_ms']:>12.3f}")
+    print(f"{'NN weights (KB)':<20}{fp32['model_bytes'] / 1024:>12.0f}{int8['model_bytes'] / 1024:>12.0f}")
+    print(f"MAE drift {report['mae_drift']:+.2f} SGD (limit {report['max_mae_drift']}): "
+          f"{'would activate' if report['activated'] else 'refused'}")
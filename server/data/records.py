@@ -0,0 +1,153 @@
+# Request parsing kept free of the heavy ML imports, so the HTTP layer can
+# validate input before (and without) loading data.infer
+
+import math
+
+REQUIRED_FIELDS = ['addr_lat', 'addr_long', 'flat_type', 'area_sqft', 'month', 'year']
+
+# Upper bound on records per batch request
+MAX_BATCH_RECORDS = 10000
+
+# Serving modes, most accurate first: the full three-model blend; the cascade, which adds
+# the TabTransformer only where LightGBM and the MLP disagree; LightGBM+MLP with
+# renormalised weights; and LightGBM alone
+ENSEMBLE_MODES = ('full', 'cascade', 'lgbm_mlp', 'lgbm')
+
+# Upper bound on grid points per sweep request
+MAX_SWEEP_POINTS = 10000
+
+
+def flat_type_to_int(flat_type):
+    # Converting flat_type into int
+    if flat_type == "EXECUTIVE":
+        return int(0)
+    if not flat_type or not flat_type[0].isdigit():
+        raise ValueError(f"Unknown flat_type {flat_type!r}")
+    return int(flat_type[0])
+
+
+def finite_float(value, name):
+    # float() accepts "nan" and "inf", and Flask's JSON parser accepts bare NaN
+    value = float(value)
+    if not math.isfinite(value):
+        raise ValueError(f'Invalid {name}: {value}')
+    return value
+
+
+def parse_record(data):
+    if not isinstance(data, dict):
+        raise ValueError('Each record must be a JSON object')
+    missing_fields = [field for field in REQUIRED_FIELDS if field not in data]
+    if missing_fields:
+        raise ValueError(f'Missing fields: {", ".join(missing_fields)}')
+
+    addr_lat = finite_float(data['addr_lat'], 'addr_lat')
+    addr_long = finite_float(data['addr_long'], 'addr_long')
+    flat_type = str(data['flat_type'])
+    area_sqft = finite_float(data['area_sqft'], 'area_sqft')
+    month = int(data['month'])
+    year = int(data['year'])
+    flat_type_to_int(flat_type)
+
+    return addr_lat, addr_long, flat_type, area_sqft, month, year
+
+
+def parse_ensemble_options(data, args):
+    # Optional mode, latency_budget_ms and members, from the JSON body or the query string
+    options = {}
+    mode = data.get('mode', args.get('mode'))
+    if mode is not None:
+        if mode not in ENSEMBLE_MODES:
+            raise ValueError(f"Unknown mode {mode!r}; expected one of {', '.join(ENSEMBLE_MODES)}")
+        options['mode'] = mode
+    budget = data.get('latency_budget_ms', args.get('latency_budget_ms'))
+    if budget is not None:
+        options['latency_budget_ms'] = float(budget)
+    members = data.get('members', args.get('members'))
+    if members is not None:
+        options['members'] = members in (True, 1, '1', 'true')
+    return options
+
+
+def parse_month(value):
+    # 'YYYY-MM' -> (year, month)
+    parts = str(value).split('-')
+    if len(parts) != 2 or not all(p.isdigit() for p in parts) or not 1 <= int(parts[1]) <= 12:
+        raise ValueError(f'Invalid month {value!r}; expected YYYY-MM')
+    return int(parts[0]), int(parts[1])
+
+
+def month_range(start, end, limit=MAX_SWEEP_POINTS):
+    # Inclusive list of (year, month) from 'YYYY-MM' to 'YYYY-MM', at most limit long
+    (y, m), end_month = parse_month(start), parse_month(end)
+    months = []
+    while (y, m) <= end_month:
+        if len(months) == limit:
+            raise ValueError(f'Month range {start} to {end} has more than {limit} months')
+        months.append((y, m))
+        y, m = (y + 1, 1) if m == 12 else (y, m + 1)
+    return months
+
+
+def _values_or_range(value, name):
+    # A single number, a list of numbers, or {"start", "stop", "step"} (inclusive)
+    if isinstance(value, dict):
+        if 'start' not in value or 'stop' not in value:
+            raise ValueError(f'{name} range needs start and stop')
+        start = finite_float(value['start'], f'{name} start')
+        stop = finite_float(value['stop'], f'{name} stop')
+        step = finite_float(value.get('step', 1), f'{name} step')
+        if step <= 0 or stop < start:
+            raise ValueError(f'{name} range needs start <= stop and a positive step')
+        # Checked before int(), which overflows for a vanishingly small step
+        steps = (stop - start) / step + 1e-9
+        if steps >= MAX_SWEEP_POINTS:
+            raise ValueError(f'{name} range has more than {MAX_SWEEP_POINTS} values')
+        count = int(steps) + 1
+        return [round(start + i * step, 6) for i in range(count)]
+    if isinstance(value, list):
+        return [finite_float(v, name) for v in value]
+    return [finite_float(value, name)]
+
+
+def parse_sweep(data):
+    # One location plus lists/ranges of flat types, areas and months -> (lat, long, flat_types, areas, months)
+    if not isinstance(data, dict):
+        raise ValueError('Expected a JSON object')
+    for field in ('addr_lat', 'addr_long', 'flat_type', 'area_sqft'):
+        if field not in data:
+            raise ValueError(f'Missing field: {field}')
+
+    addr_lat = finite_float(data['addr_lat'], 'addr_lat')
+    addr_long = finite_float(data['addr_long'], 'addr_long')
+
+    flat_types = data['flat_type'] if isinstance(data['flat_type'], list) else [data['flat_type']]
+    flat_types = [str(t) for t in flat_types]
+    for t in flat_types:
+        flat_type_to_int(t)
+
+    areas = _values_or_range(data['area_sqft'], 'area_sqft')
+
+    # "months": ["2025-01", ...] or {"start": "2025-01", "end": "2025-12"}; or a single month and year
+    if 'months' in data:
+        months = data['months']
+        if isinstance(months, dict):
+            if 'start' not in months or 'end' not in months:
+                raise ValueError('months range needs start and end')
+            months = month_range(months['start'], months['end'])
+        else:
+            months = [parse_month(m) for m in months]
+    elif 'month' in data and 'year' in data:
+        months = [(int(data['year']), int(data['month']))]
+    else:
+        raise ValueError('Missing field: months (or month and year)')
+    for year, month in months:
+        if not 1 <= month <= 12:
+            raise ValueError(f'Invalid month {year}-{month}')
+
+    points = len(flat_types) * len(areas) * len(months)
+    if points == 0:
+        raise ValueError('Empty sweep')
+    if points > MAX_SWEEP_POINTS:
+        raise ValueError(f'At most {MAX_SWEEP_POINTS} points per sweep, got {points}')
+    return addr_lat, addr_long, flat_types, areas, months
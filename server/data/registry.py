@@ -0,0 +1,181 @@
+import argparse
+import json
+import os
+import shutil
+import time
+
+from data.artifacts import file_sha256, ARTIFACT_PATH, MODEL_PATHS
+
+REGISTRY_DIR = 'models/registry'
+# Name of the active version, replaced atomically by activate()
+CURRENT_FILE = 'CURRENT'
+MANIFEST_FILE = 'manifest.json'
+MANIFEST_VERSION = 1
+
+# Bundle member -> file name inside a version directory
+BUNDLE_FILES = {
+    'lgbm': 'lgbm_model.pkl',
+    'mlp': 'best_mlp.pt',
+    'tt': 'best_tt.pt',
+    'preprocessing': 'preprocessing.json',
+}
+# Frozen TorchScript graphs, only needed for INFERENCE_BACKEND=torchscript, and the
+# town/MRT/mall indices when they differ from data/csvs/feature_indices.json
+OPTIONAL_FILES = {
+    'mlp_ts': 'best_mlp.ts',
+    'tt_ts': 'best_tt.ts',
+    'indices': 'feature_indices.json',
+}
+
+
+class Bundle:
+    """Paths and blend weights of one model version. version is None for the loose
+    files in models/, which are used while nothing has been activated."""
+
+    def __init__(self, version, paths, weights):
+        self.version = version
+        self.paths = paths
+        self.weights = weights
+
+    @property
+    def model_paths(self):
+        return {name: self.paths[name] for name in MODEL_PATHS}
+
+    @property
+    def compiled_paths(self):
+        return {name: self.paths.get(f'{name}_ts') for name in ('mlp', 'tt')}
+
+
+def loose_bundle():
+    from data.compiled import COMPILED_PATHS
+    from data.infer import w_lgb, w_mlp, w_tt, INDEX_PATH
+
+    paths = {**MODEL_PATHS, 'preprocessing': ARTIFACT_PATH, 'indices': INDEX_PATH,
+             **{f'{name}_ts': path for name, path in COMPILED_PATHS.items()}}
+    return Bundle(None, paths, {'lgbm': w_lgb, 'mlp': w_mlp, 'tt': w_tt})
+
+
+def version_dir(version, root=REGISTRY_DIR):
+    if not version or os.sep in version or version.startswith('.'):
+        raise ValueError(f'Invalid model version {version!r}')
+    return os.path.join(root, version)
+
+
+def list_versions(root=REGISTRY_DIR):
+    if not os.path.isdir(root):
+        return []
+    return sorted(v for v in os.listdir(root) if os.path.exists(os.path.join(root, v, MANIFEST_FILE)))
+
+
+def active_version(root=REGISTRY_DIR):
+    try:
+        with open(os.path.join(root, CURRENT_FILE)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def publish(version, source=None, weights=None, notes='', root=REGISTRY_DIR):
+    # Copies a complete bundle into root/version with a checksummed manifest. The
+    # directory only appears once fully written, and versions are never overwritten.
+    source = source or loose_bundle()
+    weights = weights or source.weights
+    target = version_dir(version, root)
+    if os.path.exists(target):
+        raise ValueError(f'Model version {version!r} already exists in {root}')
+
+    staging = os.path.join(root, f'.{version}.tmp')
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+    files = {}
+    for name, filename in {**BUNDLE_FILES, **OPTIONAL_FILES}.items():
+        path = source.paths.get(name)
+        if path is None or not os.path.exists(path):
+            if name in BUNDLE_FILES:
+                raise FileNotFoundError(f'Bundle member {name} not found at {path}')
+            continue
+        shutil.copyfile(path, os.path.join(staging, filename))
+        files[name] = {'file': filename, 'sha256': file_sha256(path), 'bytes': os.path.getsize(path)}
+
+    total = sum(weights.values())
+    manifest = {
+        'manifest_version': MANIFEST_VERSION,
+        'version': version,
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'notes': notes,
+        'weights': {name: w / total for name, w in weights.items()},
+        'files': files,
+    }
+    with open(os.path.join(staging, MANIFEST_FILE), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.rename(staging, target)
+    return manifest
+
+
+def load_manifest(version, root=REGISTRY_DIR, verify=True):
+    directory = version_dir(version, root)
+    with open(os.path.join(directory, MANIFEST_FILE)) as f:
+        manifest = json.load(f)
+    if manifest.get('manifest_version') != MANIFEST_VERSION:
+        raise RuntimeError(f'{version} has manifest version {manifest.get("manifest_version")}, '
+                           f'expected {MANIFEST_VERSION}')
+    if verify:
+        for name, entry in manifest['files'].items():
+            if file_sha256(os.path.join(directory, entry['file'])) != entry['sha256']:
+                raise RuntimeError(f'Checksum mismatch for {name} in model version {version!r}')
+    return manifest
+
+
+def load_bundle(version=None, root=REGISTRY_DIR):
+    # The given or active version, checksums verified; the loose files if none is active
+    version = version or active_version(root)
+    if version is None:
+        return loose_bundle()
+    manifest = load_manifest(version, root)
+    directory = version_dir(version, root)
+    paths = {name: os.path.join(directory, entry['file']) for name, entry in manifest['files'].items()}
+    if 'indices' not in paths:
+        from data.infer import INDEX_PATH
+        paths['indices'] = INDEX_PATH
+    return Bundle(version, paths, manifest['weights'])
+
+
+def activate(version, root=REGISTRY_DIR):
+    # Servers polling the registry switch over once they have loaded and warmed the new bundle
+    load_manifest(version, root)
+    tmp = os.path.join(root, f'.{CURRENT_FILE}.tmp')
+    with open(tmp, 'w') as f:
+        f.write(version + '\n')
+    os.replace(tmp, os.path.join(root, CURRENT_FILE))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Manage versioned model bundles.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    p = commands.add_parser('publish', help='copy the loose files in models/ into a new version')
+    p.add_argument('version')
+    p.add_argument('--notes', default='')
+    p.add_argument('--activate', action='store_true')
+    commands.add_parser('list', help='list versions, marking the active one')
+    p = commands.add_parser('verify', help='check a version against its manifest checksums')
+    p.add_argument('version')
+    p = commands.add_parser('activate', help='make a version the one servers load')
+    p.add_argument('version')
+    args = parser.parse_args()
+
+    if args.command == 'publish':
+        manifest = publish(args.version, notes=args.notes)
+        print(f"Published {args.version} ({', '.join(manifest['files'])})")
+        if args.activate:
+            activate(args.version)
+            print(f"Activated {args.version}")
+    elif args.command == 'list':
+        current = active_version()
+        for version in list_versions():
+            print(f"{'*' if version == current else ' '} {version}")
+    elif args.command == 'verify':
+        load_manifest(args.version)
+        print(f"{args.version}: OK")
+    elif args.command == 'activate':
+        activate(args.version)
+        print(f"Activated {args.version}")
@@ -0,0 +1,56 @@
+import hashlib
+import os
+
+import numpy as np
+import pandas as pd
+from sklearn.neighbors import BallTree
+
+from data.artifacts import file_sha256
+
+# Same mean earth radius geopy's great_circle uses, so distances agree with the
+# original loops to within floating point error (well under 1e-6 km)
+EARTH_RADIUS_KM = 6371.009
+DISTANCE_TOLERANCE_KM = 1e-6
+
+# (csv, name column, lat column, long column) per amenity type
+AMENITY_SOURCES = {
+    'mrt': ('mrt_data.csv', 'Station Name', 'Station Lat', 'Station Long'),
+    'mall': ('mall_data.csv', 'Mall Name', 'Mall Lat', 'Mall Long'),
+    'npc': ('npc_data.csv', 'NPC', 'NPC Lat', 'NPC Long'),
+    'school': ('school_data.csv', 'Search Name', 'School Lat', 'School Long'),
+    'green': ('green_data.csv', 'Green Area', 'Green Lat', 'Green Long'),
+}
+
+
+class AmenityIndex:
+    """Nearest-neighbour lookup over one amenity table, using a haversine BallTree."""
+
+    def __init__(self, names, lats, longs):
+        self.names = np.asarray(names, dtype=object)
+        coords = np.radians(np.column_stack([lats, longs]).astype(np.float64))
+        self.tree = BallTree(coords, metric='haversine')
+
+    def query(self, lat, long):
+        names, dists = self.query_batch([lat], [long])
+        return names[0], float(dists[0])
+
+    def query_batch(self, lats, longs):
+        coords = np.radians(np.column_stack([lats, longs]).astype(np.float64))
+        dist, idx = self.tree.query(coords, k=1)
+        return self.names[idx[:, 0]], dist[:, 0] * EARTH_RADIUS_KM
+
+
+def load_amenity_indexes(csv_dir='data/csvs'):
+    indexes = {}
+    for kind, (csv, name_col, lat_col, long_col) in AMENITY_SOURCES.items():
+        df = pd.read_csv(f"{csv_dir}/{csv}")
+        if kind == 'mall':
+            df = df.drop(df[df["Mall Name"] == "NIL"].index)
+        indexes[kind] = AmenityIndex(df[name_col], df[lat_col], df[long_col])
+    return indexes
+
+
+def amenity_digest(csv_dir='data/csvs'):
+    # Identifies the amenity tables that cached distances were computed from
+    return hashlib.sha256(''.join(
+        file_sha256(os.path.join(csv_dir, csv)) for csv, *_ in AMENITY_SOURCES.values()).encode()).hexdigest()
@@ -0,0 +1,169 @@
+import argparse
+import json
+import math
+import os
+import threading
+
+import numpy as np
+
+TILES_DIR = 'data/tiles'
+# Regular lat/long grid over Singapore
+BOUNDS = {'lat_min': 1.20, 'lat_max': 1.48, 'long_min': 103.60, 'long_max': 104.05}
+RESOLUTION_DEG = 0.002
+# Grid cells are stored in BLOCK x BLOCK blocks, so a map tile touches only a few pages
+BLOCK = 32
+# Served map tiles are TILE_PIXELS x TILE_PIXELS float16 values, NaN where there is no estimate
+TILE_PIXELS = 256
+FLAT_TYPES = ['EXECUTIVE', '1-ROOM', '2-ROOM', '3-ROOM', '4-ROOM', '5-ROOM']
+
+
+def grid_shape(bounds=BOUNDS, resolution=RESOLUTION_DEG):
+    rows = int(math.ceil((bounds['lat_max'] - bounds['lat_min']) / resolution))
+    cols = int(math.ceil((bounds['long_max'] - bounds['long_min']) / resolution))
+    return rows, cols
+
+
+def map_path(root, flat_type_int, year, month):
+    return os.path.join(root, str(flat_type_int), f'{year}-{month:02d}.npy')
+
+
+def typical_areas_sqft(test_csv='data/csvs/df_test.csv'):
+    # Median floor area per flat type, so each surface shows a typical flat of that type
+    from data.artifacts import load_training_frame
+    df = load_training_frame(test_csv)
+    return {int(k): round(float(v) * 10.764, 1) for k, v in df.groupby('flat_type_int')['floor_area_sqm'].median().items()}
+
+
+def build_tiles(engine, months, root=TILES_DIR, bounds=BOUNDS, resolution=RESOLUTION_DEG, flat_types=FLAT_TYPES):
+    from data.buildings import MAX_BLOCK_DISTANCE_KM
+    from data.records import flat_type_to_int
+
+    rows, cols = grid_shape(bounds, resolution)
+    block_rows, block_cols = -(-rows // BLOCK), -(-cols // BLOCK)
+    lats = bounds['lat_min'] + (np.arange(rows) + 0.5) * resolution
+    longs = bounds['long_min'] + (np.arange(cols) + 0.5) * resolution
+    grid_lat, grid_long = (a.ravel() for a in np.meshgrid(lats, longs, indexing='ij'))
+
+    # Location and building features depend only on the cell, so they are computed once,
+    # in one batched amenity lookup, and reused for every flat type and month
+    n = len(grid_lat)
+    base = engine.build_features(grid_lat, grid_long, ['EXECUTIVE'] * n, np.zeros(n), np.ones(n), np.ones(n))
+    ok = np.ones(n, dtype=bool)
+    ok[list(engine.feature_errors(base))] = False
+    if engine.buildings is not None:
+        # Only cells near an HDB block get a rent estimate
+        _, dist = engine.buildings.index.query_batch(grid_lat, grid_long)
+        ok &= dist <= MAX_BLOCK_DISTANCE_KM
+    base = base[ok]
+
+    areas = typical_areas_sqft()
+    written = []
+    for flat_type in flat_types:
+        ft = flat_type_to_int(flat_type)
+        features = base.copy()
+        features['flat_type_int'] = ft
+        features['floor_area_sqm'] = round(areas[ft] / 10.764, 2)
+        for year, month in months:
+            features['month'] = month
+            features['year'] = year
+            values = np.full(n, np.nan, dtype=np.float32)
+            values[ok] = engine.predict_frame(features)
+
+            # Written block row by block row straight into the memory-mapped file
+            path = map_path(root, ft, year, month)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = path + '.tmp'
+            out = np.lib.format.open_memmap(tmp, mode='w+', dtype=np.float16,
+                                            shape=(block_rows, block_cols, BLOCK, BLOCK))
+            grid = values.reshape(rows, cols)
+            for br in range(block_rows):
+                strip = np.full((BLOCK, block_cols * BLOCK), np.nan, dtype=np.float16)
+                part = grid[br * BLOCK:(br + 1) * BLOCK]
+                strip[:len(part), :cols] = part
+                out[br] = strip.reshape(BLOCK, block_cols, BLOCK).swapaxes(0, 1)
+            out.flush()
+            del out
+            os.replace(tmp, path)
+            written.append(path)
+
+    index = {
+        'bounds': bounds, 'resolution': resolution, 'shape': [rows, cols], 'block': BLOCK,
+        'flat_types': {str(flat_type_to_int(t)): t for t in flat_types},
+        'area_sqft': {str(flat_type_to_int(t)): areas[flat_type_to_int(t)] for t in flat_types},
+        'months': [f'{y}-{m:02d}' for y, m in months],
+        'model_version': engine.version,
+    }
+    with open(os.path.join(root, 'index.json'), 'w') as f:
+        json.dump(index, f, indent=2)
+    return written
+
+
+def tile_centres(z, x, y, pixels=TILE_PIXELS):
+    # Lat/long of each pixel centre of Web Mercator (slippy map) tile z/x/y
+    n = 2 ** z
+    offsets = (np.arange(pixels) + 0.5) / pixels
+    longs = (x + offsets) / n * 360.0 - 180.0
+    lats = np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * (y + offsets) / n))))
+    return lats, longs
+
+
+class TileStore:
+    """Serves map tiles from the block files written by build_tiles, read through np.memmap
+    so only the pages a tile touches are loaded and all server workers share them."""
+
+    def __init__(self, root=TILES_DIR):
+        self.root = root
+        with open(os.path.join(root, 'index.json')) as f:
+            self.index = json.load(f)
+        self.rows, self.cols = self.index['shape']
+        self.block = self.index['block']
+        self.maps = {}
+        self.lock = threading.Lock()
+
+    def open(self, flat_type_int, year, month):
+        key = (flat_type_int, year, month)
+        grid = self.maps.get(key)
+        if grid is None:
+            path = map_path(self.root, flat_type_int, year, month)
+            if not os.path.exists(path):
+                raise KeyError(f'No tiles for flat type {flat_type_int} in {year}-{month:02d}')
+            with self.lock:
+                grid = self.maps.setdefault(key, np.load(path, mmap_mode='r'))
+        return grid
+
+    def tile(self, flat_type_int, year, month, z, x, y):
+        # None when the tile lies entirely outside the grid
+        grid = self.open(flat_type_int, year, month)
+        bounds, res = self.index['bounds'], self.index['resolution']
+        lats, longs = tile_centres(z, x, y)
+        r = np.floor((lats - bounds['lat_min']) / res).astype(np.int64)
+        c = np.floor((longs - bounds['long_min']) / res).astype(np.int64)
+        r_ok = (r >= 0) & (r < self.rows)
+        c_ok = (c >= 0) & (c < self.cols)
+        if not r_ok.any() or not c_ok.any():
+            return None
+
+        out = np.full((len(r), len(c)), np.nan, dtype=np.float16)
+        rr, cc = np.meshgrid(r[r_ok], c[c_ok], indexing='ij')
+        b = self.block
+        out[np.ix_(r_ok, c_ok)] = grid[rr // b, cc // b, rr % b, cc % b]
+        return out
+
+
+if __name__ == '__main__':
+    from data.infer import InferenceEngine
+    from data.records import month_range
+
+    parser = argparse.ArgumentParser(description='Precompute rent heat-map tiles over Singapore.')
+    parser.add_argument('--start', default='2025-01', help='first month, YYYY-MM')
+    parser.add_argument('--end', default='2025-12', help='last month, YYYY-MM')
+    parser.add_argument('--flat-types', nargs='+', default=FLAT_TYPES)
+    parser.add_argument('--resolution', type=float, default=RESOLUTION_DEG, help='grid step in degrees')
+    parser.add_argument('--out', default=TILES_DIR)
+    args = parser.parse_args()
+
+    rows, cols = grid_shape(resolution=args.resolution)
+    months = month_range(args.start, args.end)
+    written = build_tiles(InferenceEngine(), months, args.out, resolution=args.resolution,
+                          flat_types=args.flat_types)
+    print(f"Wrote {len(written)} maps of {rows}x{cols} cells to {args.out}")
@@ -0,0 +1,119 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+# `import main` must finish within this many seconds, without loading any of HEAVY_MODULES
+IMPORT_BUDGET_SECONDS = 1.0
+HEAVY_MODULES = ('torch', 'lightgbm', 'sklearn', 'pandas', 'geopy', 'joblib')
+
+# Central Singapore; only used to push one row through every model
+WARMUP_RECORD = (1.3521, 103.8198, '4-ROOM', 1000.0, 1, 2025)
+
+
+def dummy_forward(engine):
+    # One full pass so lazy allocations (BallTree buffers, torch kernels and thread
+    # pools, LightGBM's predictor) happen now rather than on the first request.
+    # A location without an MRT/mall index is still scored, with the index zeroed.
+    df = engine.build_features(*([v] for v in WARMUP_RECORD))
+    df[['mrt_index', 'mall_index']] = df[['mrt_index', 'mall_index']].fillna(0.0)
+    engine.predict_frame(df)
+
+
+class Warmup:
+    """Loads the inference engine on a background thread so the HTTP layer can start
+    serving /healthz straight away; ready is set once the models are loaded and warm.
+    With forward=False the dummy prediction is skipped, for a gunicorn master that must
+    not start OpenMP thread pools before forking."""
+
+    def __init__(self, forward=True):
+        self.forward = forward
+        self.state = 'pending'
+        self.error = None
+        self.timings = {}
+        self.ready = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='warmup', daemon=True)
+                self._thread.start()
+        return self
+
+    def wait(self, timeout=None):
+        self.start()
+        self._thread.join(timeout)
+        if self.error is not None:
+            raise RuntimeError(f'Inference engine failed to load: {self.error}')
+        return self.ready.is_set()
+
+    def _run(self):
+        try:
+            self.state = 'importing'
+            start = time.perf_counter()
+            from data.infer import get_engine
+            self.timings['import'] = time.perf_counter() - start
+
+            self.state = 'loading'
+            start = time.perf_counter()
+            engine = get_engine()
+            self.timings['load'] = time.perf_counter() - start
+
+            if self.forward:
+                self.state = 'warming'
+                start = time.perf_counter()
+                dummy_forward(engine)
+                self.timings['warmup'] = time.perf_counter() - start
+
+            self.state = 'ready'
+            self.ready.set()
+        except Exception as e:
+            self.state = 'failed'
+            self.error = f'{type(e).__name__}: {e}'
+
+    def status(self):
+        return {
+            'state': self.state,
+            'ready': self.ready.is_set(),
+            'error': self.error,
+            'timings_ms': {phase: 1000.0 * seconds for phase, seconds in self.timings.items()},
+        }
+
+
+def measure_import(module='main'):
+    # Fresh interpreter, so nothing is already in sys.modules
+    code = (f"import json, sys, time; start = time.perf_counter(); import {module}; "
+            f"print(json.dumps([time.perf_counter() - start, "
+            f"[m for m in {HEAVY_MODULES!r} if m in sys.modules]]))")
+    # Background warm-up is left off so it cannot import anything while we look
+    env = {**os.environ, 'SERVER_WARMUP': '0'}
+    proc = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, env=env)
+    if proc.returncode != 0:
+        raise RuntimeError(f'import {module} failed:\n{proc.stderr}')
+    elapsed, loaded = json.loads(proc.stdout.strip().splitlines()[-1])
+    return elapsed, loaded
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Check that importing the server stays within its startup budget.')
+    parser.add_argument('--module', default='main')
+    parser.add_argument('--budget', type=float, default=IMPORT_BUDGET_SECONDS, help='seconds')
+    args = parser.parse_args()
+
+    elapsed, loaded = measure_import(args.module)
+    print(f"import {args.module}: {1000.0 * elapsed:.0f} ms (budget {1000.0 * args.budget:.0f} ms)")
+    failures = []
+    if elapsed > args.budget:
+        failures.append('over the import-time budget')
+    if loaded:
+        failures.append(f"loads {', '.join(loaded)} at import")
+    if failures:
+        print('FAIL: ' + '; '.join(failures))
+        sys.exit(1)
+    print('OK')
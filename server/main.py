@@ -1,33 +1,255 @@
-from flask import Flask, request, jsonify
-from data.infer import get_prediction
+import os
+import time
+from flask import Flask, request, jsonify, g
+from data import metrics
+from data.batching import MicroBatcher
+from data.cache import cache_from_env
+from data.profiling import profile
+from data.records import parse_record, parse_sweep, parse_ensemble_options, flat_type_to_int, REQUIRED_FIELDS, MAX_BATCH_RECORDS
+from data.warmup import Warmup
 from flask_cors import CORS
 
 app = Flask(__name__)
 CORS(app)
 
+# Models, scaler and encoders load in the background; /readyz reports when they are warm.
+# data.infer (pandas, torch, LightGBM, scikit-learn) is only imported from there on.
+# With SERVER_WARMUP=0 loading starts on the first request instead.
+warmup = Warmup()
+if os.environ.get('SERVER_WARMUP', '1') == '1':
+    warmup.start()
+
+def get_engine():
+    from data.infer import get_engine
+    return get_engine()
+
+def get_prediction(*parsed):
+    from data.infer import get_prediction
+    return get_prediction(*parsed)
+
+def get_predictions(records):
+    from data.infer import get_predictions
+    return get_predictions(records)
+
+def get_prediction_detail(*parsed, **options):
+    from data.infer import get_prediction_detail
+    return get_prediction_detail(*parsed, **options)
+
+def get_sweep(*sweep):
+    from data.infer import get_sweep
+    return get_sweep(*sweep)
+
+# Optional dynamic batching of concurrent /predict calls
+batcher = None
+if os.environ.get('MICROBATCH', '0') == '1':
+    batcher = MicroBatcher(get_engine,
+                           max_batch_size=int(os.environ.get('MICROBATCH_MAX_SIZE', '64')),
+                           max_wait_ms=float(os.environ.get('MICROBATCH_MAX_WAIT_MS', '5')))
+
+# Optional prediction cache keyed on quantised inputs
+cache = cache_from_env(get_engine)
+
+def engine_info():
+    if not warmup.ready.is_set():
+        return {}
+    engine = get_engine()
+    return {(engine.version, engine.backend): engine.loaded_at}
+
+def cache_hit_ratios():
+    ratios = {}
+    if warmup.ready.is_set():
+        ratios[('location',)] = get_engine().locations.stats()['hit_ratio']
+    if cache is not None:
+        ratios[('prediction',)] = cache.stats()['hit_ratio']
+    return ratios
+
+def batcher_queue_depth():
+    return {(): batcher.stats()['queue_depth']} if batcher is not None else {}
+
+def startup_seconds():
+    return {(phase,): seconds for phase, seconds in warmup.timings.items()}
+
+metrics.Gauge('rent_model_loaded_timestamp_seconds', 'Unix time the inference engine finished loading',
+              ['version', 'backend'], fn=engine_info)
+metrics.Gauge('rent_cache_hit_ratio', 'Hit ratio of the prediction and location feature caches',
+              ['cache'], fn=cache_hit_ratios)
+metrics.Gauge('rent_batcher_queue_depth', 'Requests waiting in the micro-batcher', fn=batcher_queue_depth)
+metrics.Gauge('rent_startup_seconds', 'Time spent importing, loading and warming up the models',
+              ['phase'], fn=startup_seconds)
+
+# Paths served while the models are still loading; tiles are precomputed and need no models
+UNGATED_PATHS = {'/healthz', '/readyz', '/metrics'}
+UNGATED_PREFIXES = ('/tiles/',)
+
+# Deepest slippy-map zoom level served; far larger z overflows the float maths in tile_centres
+MAX_TILE_ZOOM = 22
+
+_tiles = None
+
+def get_tiles():
+    # Opened on first use; None when `python -m data.tiles` has not been run
+    global _tiles
+    if _tiles is None:
+        from data.tiles import TileStore, TILES_DIR
+        if os.path.exists(os.path.join(TILES_DIR, 'index.json')):
+            _tiles = TileStore(TILES_DIR)
+    return _tiles
+
+@app.before_request
+def start_timer():
+    g.start = time.perf_counter()
+    gated = request.path not in UNGATED_PATHS and not request.path.startswith(UNGATED_PREFIXES)
+    if gated and not warmup.ready.is_set():
+        warmup.start()
+        return jsonify({'error': 'Models are still loading', **warmup.status()}), 503, {'Retry-After': '5'}
+
+@app.after_request
+def record_request(response):
+    endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    if endpoint != '/metrics':
+        metrics.REQUESTS.inc(endpoint=endpoint, status=response.status_code)
+        metrics.REQUEST_SECONDS.observe(time.perf_counter() - g.start, endpoint=endpoint)
+    return response
+
+def predict_one(parsed):
+    if batcher is None:
+        return get_prediction(*parsed)
+    result = batcher.predict(parsed)
+    if 'error' in result:
+        raise ValueError(result['error'])
+    return result['prediction']
+
 @app.route('/predict', methods=['POST'])
 def predict():
     data = request.json
 
-    required_fields = ['addr_lat', 'addr_long', 'flat_type', 'area_sqft', 'month', 'year']
-    missing_fields = [field for field in required_fields if field not in data]
+    missing_fields = [field for field in REQUIRED_FIELDS if field not in data]
 
     if missing_fields:
         return jsonify({'error': f'Missing fields: {", ".join(missing_fields)}'}), 400
 
     try:
-        addr_lat = float(data['addr_lat'])
-        addr_long = float(data['addr_long'])
-        flat_type = str(data['flat_type'])
-        area_sqft = float(data['area_sqft'])
-        month = int(data['month'])
-        year = int(data['year'])
+        parsed = parse_record(data)
+        options = parse_ensemble_options(data, request.args)
+        if request.args.get('profile') == '1' or options:
+            # Bypasses the cache and batcher: they only serve the default ensemble mode,
+            # and profiling needs the stages to run on this thread
+            with profile() as stages:
+                result = get_prediction_detail(*parsed, **options)
+            if request.args.get('profile') == '1':
+                result['profile_ms'] = {name: 1000.0 * seconds for name, seconds in stages.items()}
+            return jsonify(result)
 
-        prediction = get_prediction(addr_lat, addr_long, flat_type, area_sqft, month, year)
+        if cache is None:
+            prediction = predict_one(parsed)
+        else:
+            prediction = cache.get_or_compute(parsed, predict_one)
 
         return jsonify({'prediction': prediction})
     except Exception as e:
+        metrics.ERRORS.inc(endpoint='/predict', type=type(e).__name__)
         return jsonify({'error': str(e)}), 500
 
+@app.route('/predict/batch', methods=['POST'])
+def predict_batch():
+    data = request.json
+    records = data.get('records') if isinstance(data, dict) else data
+
+    if not isinstance(records, list):
+        return jsonify({'error': 'Expected a list of records or {"records": [...]}'}), 400
+    if len(records) > MAX_BATCH_RECORDS:
+        return jsonify({'error': f'At most {MAX_BATCH_RECORDS} records per batch'}), 413
+
+    try:
+        predictions = get_predictions(records)
+    except Exception as e:
+        metrics.ERRORS.inc(endpoint='/predict/batch', type=type(e).__name__)
+        return jsonify({'error': str(e)}), 500
+
+    row_errors = sum('error' in p for p in predictions)
+    if row_errors:
+        metrics.ERRORS.inc(row_errors, endpoint='/predict/batch', type='RowError')
+    return jsonify({'predictions': predictions})
+
+@app.route('/predict/sweep', methods=['POST'])
+def predict_sweep():
+    try:
+        addr_lat, addr_long, flat_types, areas, months = parse_sweep(request.json)
+    except (ValueError, TypeError, KeyError) as e:
+        return jsonify({'error': str(e)}), 400
+
+    try:
+        grid = get_sweep(addr_lat, addr_long, flat_types, areas, months)
+    except Exception as e:
+        metrics.ERRORS.inc(endpoint='/predict/sweep', type=type(e).__name__)
+        return jsonify({'error': str(e)}), 500
+
+    # predictions[i][j][k] is for months[i], flat_types[j], area_sqft[k]
+    return jsonify({
+        'months': [f'{y}-{m:02d}' for y, m in months],
+        'flat_types': flat_types,
+        'area_sqft': areas,
+        'predictions': grid.tolist(),
+    })
+
+@app.route('/tiles/<flat_type>/<int:year>-<int:month>/<int:z>/<int:x>/<int:y>', methods=['GET'])
+def tile(flat_type, year, month, z, x, y):
+    # Raw little-endian float16 rents, TILE_PIXELS x TILE_PIXELS, row-major from the north-west corner
+    if not 0 <= z <= MAX_TILE_ZOOM or not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        return jsonify({'error': f'No tile {z}/{x}/{y}; zoom levels run from 0 to {MAX_TILE_ZOOM}'}), 404
+    tiles = get_tiles()
+    if tiles is None:
+        return jsonify({'error': 'No tiles have been built; run `python -m data.tiles`'}), 404
+    try:
+        values = tiles.tile(flat_type_to_int(flat_type.replace('_', ' ')), year, month, z, x, y)
+    except (ValueError, KeyError) as e:
+        return jsonify({'error': e.args[0]}), 404
+    if values is None:
+        return '', 204
+    return values.astype('<f2').tobytes(), 200, {
+        'Content-Type': 'application/octet-stream',
+        'X-Tile-Size': str(values.shape[0]),
+        'X-Tile-Dtype': 'float16',
+        'Cache-Control': 'public, max-age=86400',
+    }
+
+@app.route('/models', methods=['GET'])
+def models():
+    from data.registry import active_version, list_versions
+    engine = get_engine()
+    return jsonify({
+        'serving': engine.bundle.version,
+        'engine_version': engine.version,
+        'active': active_version(),
+        'versions': list_versions(),
+    })
+
+@app.route('/batcher/stats', methods=['GET'])
+def batcher_stats():
+    if batcher is None:
+        return jsonify({'enabled': False})
+    return jsonify({'enabled': True, **batcher.stats()})
+
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    if cache is None:
+        return jsonify({'enabled': False})
+    return jsonify({'enabled': True, **cache.stats()})
+
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    # Liveness: the process is up and serving HTTP
+    return jsonify({'status': 'ok'})
+
+@app.route('/readyz', methods=['GET'])
+def readyz():
+    # Readiness: models loaded and one dummy forward pass done
+    status = warmup.status()
+    return jsonify(status), 200 if status['ready'] else 503
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    return metrics.render(), 200, {'Content-Type': 'text/plain; version=0.0.4'}
+
 if __name__ == '__main__':
     app.run(debug=True)
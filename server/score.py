@@ -0,0 +1,168 @@
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from data.records import REQUIRED_FIELDS
+
+# Rows read, featurised and scored together
+CHUNK_ROWS = 50000
+
+
+def read_chunks(path, chunk_rows, skip_chunks=0):
+    # Yields (chunk number, DataFrame) with at most chunk_rows rows held per chunk
+    if path.endswith('.parquet'):
+        import pyarrow.parquet as pq
+        batches = pq.ParquetFile(path).iter_batches(batch_size=chunk_rows)
+        for n, batch in enumerate(batches):
+            if n >= skip_chunks:
+                yield n, batch.to_pandas()
+    else:
+        # Already-scored rows are skipped by the CSV parser instead of being read into chunks
+        reader = pd.read_csv(path, chunksize=chunk_rows, skiprows=range(1, 1 + skip_chunks * chunk_rows))
+        for n, chunk in enumerate(reader, start=skip_chunks):
+            yield n, chunk
+
+
+def init_worker(torch_threads):
+    # Each pool process loads the models once and reuses them for every chunk it scores
+    import torch
+    from data.infer import get_engine
+    torch.set_num_threads(torch_threads)
+    get_engine()
+
+
+def score_chunk(chunk):
+    from data.infer import get_engine, NON_FINITE_ERROR
+    from data.records import flat_type_to_int
+
+    n = len(chunk)
+    errors = np.full(n, None, dtype=object)
+    cols = {}
+    for field in ('addr_lat', 'addr_long', 'area_sqft', 'month', 'year'):
+        cols[field] = pd.to_numeric(chunk[field], errors='coerce').values.astype(np.float64)
+    cols['flat_type'] = chunk['flat_type'].astype(str).values
+
+    bad = np.zeros(n, dtype=bool)
+    for field in ('addr_lat', 'addr_long', 'area_sqft', 'month', 'year'):
+        # Missing, unparseable and infinite values alike
+        invalid = ~np.isfinite(cols[field])
+        errors[invalid & ~bad] = f'Invalid {field}'
+        bad |= invalid
+    for i, flat_type in enumerate(cols['flat_type']):
+        if not bad[i]:
+            try:
+                flat_type_to_int(flat_type)
+            except ValueError as e:
+                errors[i] = str(e)
+                bad[i] = True
+
+    preds = np.full(n, np.nan)
+    ok = np.flatnonzero(~bad)
+    if len(ok):
+        scored, row_errors = get_engine().predict_columns(
+            cols['addr_lat'][ok], cols['addr_long'][ok], cols['flat_type'][ok], cols['area_sqft'][ok],
+            cols['month'][ok].astype(np.int64), cols['year'][ok].astype(np.int64))
+        preds[ok] = np.round(scored, 2)
+        # Same rule as /predict/batch: a NaN or infinite prediction is a row error
+        errors[ok[~np.isfinite(scored)]] = NON_FINITE_ERROR
+        for pos, msg in row_errors.items():
+            errors[ok[pos]] = msg
+
+    out = chunk.copy()
+    out['predicted_rent'] = preds
+    out['error'] = errors
+    return out
+
+
+class Progress:
+    """Sidecar file recording how many chunks of the output are complete, and its size
+    at that point, so an interrupted run can truncate a partial write and carry on."""
+
+    def __init__(self, out_path, source, chunk_rows):
+        self.path = out_path + '.progress'
+        self.state = {'source': os.path.abspath(source), 'chunk_rows': chunk_rows,
+                      'chunks': 0, 'rows': 0, 'bytes': 0}
+
+    def resume(self, out_path):
+        if not os.path.exists(self.path):
+            return 0
+        with open(self.path) as f:
+            saved = json.load(f)
+        if (saved['source'], saved['chunk_rows']) != (self.state['source'], self.state['chunk_rows']):
+            raise ValueError(f"{self.path} belongs to a run over {saved['source']} with "
+                             f"--chunk-rows {saved['chunk_rows']}; delete it to start over")
+        self.state = saved
+        with open(out_path, 'r+b') as f:
+            f.truncate(saved['bytes'])
+        return saved['chunks']
+
+    def commit(self, rows, size):
+        self.state['chunks'] += 1
+        self.state['rows'] += rows
+        self.state['bytes'] = size
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.state, f)
+        os.replace(tmp, self.path)
+
+
+def score_file(source, out_path, workers, chunk_rows=CHUNK_ROWS, torch_threads=1, restart=False):
+    progress = Progress(out_path, source, chunk_rows)
+    if restart:
+        for path in (out_path, progress.path):
+            if os.path.exists(path):
+                os.remove(path)
+    done = progress.resume(out_path)
+
+    start = time.perf_counter()
+    scored = 0
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(torch_threads,)) as pool, \
+            open(out_path, 'a' if done else 'w', newline='') as out:
+        # A bounded window of chunks in flight keeps memory flat; results are written in input order
+        pending = []
+        chunks = read_chunks(source, chunk_rows, skip_chunks=done)
+        exhausted = False
+        while pending or not exhausted:
+            while not exhausted and len(pending) < 2 * workers:
+                try:
+                    n, chunk = next(chunks)
+                except StopIteration:
+                    exhausted = True
+                    break
+                missing = [c for c in REQUIRED_FIELDS if c not in chunk.columns]
+                if missing:
+                    raise ValueError(f'{source} is missing columns: {", ".join(missing)}')
+                pending.append((n, pool.submit(score_chunk, chunk)))
+            if not pending:
+                break
+
+            n, future = pending.pop(0)
+            result = future.result()
+            result.to_csv(out, header=(n == 0), index=False)
+            out.flush()
+            os.fsync(out.fileno())
+            progress.commit(len(result), out.tell())
+            scored += len(result)
+            print(f"chunk {n}: {progress.state['rows']} rows written "
+                  f"({scored / (time.perf_counter() - start):.0f} rows/s)")
+
+    return progress.state
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Score a CSV or Parquet file of listings with the ensemble.')
+    parser.add_argument('source', help=f'CSV or .parquet with columns {", ".join(REQUIRED_FIELDS)}')
+    parser.add_argument('out', help='CSV to write; the input columns plus predicted_rent and error')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS)
+    parser.add_argument('--torch-threads', type=int, default=1, help='intra-op threads per worker')
+    parser.add_argument('--restart', action='store_true', help='ignore earlier progress and start over')
+    args = parser.parse_args()
+
+    state = score_file(args.source, args.out, args.workers, args.chunk_rows, args.torch_threads, args.restart)
+    print(f"Wrote {state['rows']} rows to {args.out}")
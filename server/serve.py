@@ -0,0 +1,90 @@
+import argparse
+import gc
+import multiprocessing
+import os
+
+from gunicorn.app.base import BaseApplication
+
+
+class PredictionServer(BaseApplication):
+    """gunicorn with the Flask app preloaded in the master, so the ensemble and
+    amenity tables are loaded once and shared copy-on-write by forked workers.
+
+    `kill -HUP <master pid>` reloads the model artifacts in the master and
+    replaces the workers; old workers finish their in-flight requests first."""
+
+    def __init__(self, options):
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        # Workers are forked from the master, so it finishes loading the models first.
+        # It does not run them: LightGBM's and torch's OpenMP thread pools are not fork-safe,
+        # and a child forked after the master used them can hang on its first parallel
+        # call. Each worker runs the dummy prediction itself in post_fork.
+        os.environ['SERVER_WARMUP'] = '0'
+        from main import app, warmup
+        warmup.forward = False
+        warmup.wait()
+        return app
+
+
+def when_ready(server):
+    # Keep the preloaded objects out of the cyclic GC so collections in the
+    # workers do not touch (and copy) their pages
+    gc.freeze()
+
+
+def on_reload(server):
+    # Runs in the master before the replacement workers are forked
+    from data.infer import reload_engine
+    gc.unfreeze()
+    # Not warmed here, for the same reason as in PredictionServer.load
+    reload_engine(warm=False)
+    gc.collect()
+    gc.freeze()
+    server.log.info("Reloaded model artifacts")
+
+
+def make_post_fork(torch_threads):
+    def post_fork(server, worker):
+        import torch
+        from data.infer import get_engine
+        from data.warmup import dummy_forward
+        torch.set_num_threads(torch_threads)
+        # The worker's own first forward pass, so its OpenMP pools are created after the fork
+        dummy_forward(get_engine())
+    return post_fork
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run the prediction API with multiple preloaded workers.')
+    parser.add_argument('--bind', default='0.0.0.0:5000')
+    parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count())
+    parser.add_argument('--threads', type=int, default=1, help='request threads per worker')
+    parser.add_argument('--torch-threads', type=int, default=None,
+                        help='intra-op threads per worker (default: cores // workers)')
+    parser.add_argument('--timeout', type=int, default=60)
+    args = parser.parse_args()
+
+    torch_threads = args.torch_threads or max(1, multiprocessing.cpu_count() // args.workers)
+    # Must be set before torch and LightGBM create their OpenMP pools
+    for var in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS'):
+        os.environ.setdefault(var, str(torch_threads))
+
+    PredictionServer({
+        'bind': args.bind,
+        'workers': args.workers,
+        'threads': args.threads,
+        'worker_class': 'gthread' if args.threads > 1 else 'sync',
+        'timeout': args.timeout,
+        'graceful_timeout': args.timeout,
+        'preload_app': True,
+        'when_ready': when_ready,
+        'on_reload': on_reload,
+        'post_fork': make_post_fork(torch_threads),
+    }).run()
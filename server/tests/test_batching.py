@@ -0,0 +1,25 @@
+from concurrent.futures import wait
+
+import pytest
+
+from data.batching import MicroBatcher
+
+
+class Engine:
+    # Stands in for InferenceEngine.predict_parsed: any batch holding a None fails whole
+    def predict_parsed(self, parsed):
+        if None in parsed:
+            raise ValueError('bad row')
+        return [{'prediction': float(p)} for p in parsed]
+
+
+def test_failed_batch_only_fails_the_bad_request():
+    batcher = MicroBatcher(Engine, max_batch_size=8, max_wait_ms=200)
+    futures = [batcher.submit(p) for p in (1, None, 3)]
+    wait(futures, timeout=5)
+
+    assert futures[0].result() == {'prediction': 1.0}
+    assert futures[2].result() == {'prediction': 3.0}
+    with pytest.raises(ValueError, match='bad row'):
+        futures[1].result()
+    assert batcher.stats()['batches'] == 1
@@ -0,0 +1,66 @@
+import pytest
+
+torch = pytest.importorskip('torch')
+pytest.importorskip('pandas')
+pytest.importorskip('sklearn')
+pytest.importorskip('joblib')
+
+from data.artifacts import Preprocessor
+from data.compiled import compile_models, example_inputs, fold_mlp
+from data.infer import MLPRegressorPT, TabTransformerRegressor
+
+# Small stand-in for models/preprocessing.json: three numeric and two categorical features
+CAT_VALUES = {'month': [1, 2, 3, 4], 'flat_type_int': [0, 3, 4]}
+
+
+def synthetic_prep():
+    return Preprocessor({
+        'num_feats': ['floor_area_sqm', 'age_of_bldg', 'town_index'],
+        'cat_feats': list(CAT_VALUES),
+        'scaler_mean': [0.0, 0.0, 0.0],
+        'scaler_scale': [1.0, 1.0, 1.0],
+        'oh_categories': list(CAT_VALUES.values()),
+        'cat_codes': CAT_VALUES,
+        'cat_cards': [len(v) for v in CAT_VALUES.values()],
+    })
+
+
+def random_models(prep):
+    torch.manual_seed(0)
+    mlp = MLPRegressorPT(len(prep.num_feats) + prep.one_hot_width)
+    # Non-trivial running statistics, so folding BatchNorm actually changes the weights
+    for bn in (m for m in mlp.net if isinstance(m, torch.nn.BatchNorm1d)):
+        bn.running_mean.uniform_(-1.0, 1.0)
+        bn.running_var.uniform_(0.5, 2.0)
+        bn.weight.data.uniform_(0.5, 1.5)
+        bn.bias.data.uniform_(-0.5, 0.5)
+    tt = TabTransformerRegressor(len(prep.num_feats), prep.cat_cards)
+    return mlp.eval(), tt.eval()
+
+
+def test_fold_mlp_removes_batchnorm_and_dropout():
+    mlp, _ = random_models(synthetic_prep())
+    folded = fold_mlp(mlp)
+    assert not any(isinstance(m, (torch.nn.BatchNorm1d, torch.nn.Dropout)) for m in folded)
+
+
+def test_compiled_models_match_eager():
+    # PARITY_ATOL is sized for rents in SGD; these random models output values around 1,
+    # so they are held to float32 round-off instead
+    prep = synthetic_prep()
+    mlp, tt = random_models(prep)
+    mlp_ts, tt_ts = compile_models(mlp, tt, prep)
+    for n in (1, 7, 256):
+        x_mlp, x_num, codes = example_inputs(prep, n, seed=n)
+        with torch.no_grad():
+            assert torch.allclose(mlp(x_mlp), mlp_ts(x_mlp), atol=1e-5, rtol=1e-4)
+            assert torch.allclose(tt(x_num, *codes.unbind(1)), tt_ts(x_num, *codes.unbind(1)),
+                                  atol=1e-5, rtol=1e-4)
+
+
+def test_folded_mlp_matches_eager():
+    prep = synthetic_prep()
+    mlp, _ = random_models(prep)
+    x_mlp, _, _ = example_inputs(prep, 64)
+    with torch.no_grad():
+        assert torch.allclose(mlp(x_mlp), fold_mlp(mlp)(x_mlp), atol=1e-5, rtol=1e-4)
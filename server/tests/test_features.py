@@ -0,0 +1,76 @@
+import json
+
+import pytest
+
+pd = pytest.importorskip('pandas')
+pytest.importorskip('pyarrow')
+pytest.importorskip('sklearn')
+
+from data.features import FINAL_COLUMNS, run
+
+BLOCKS = [('1', 'BEACH RD', 'KWN', 1.3016, 103.8637), ('2', 'BEACH RD', 'KWN', 1.3019, 103.8641),
+          ('10', 'TAMPINES ST 11', 'TAP', 1.3540, 103.9450)]
+MONTHS = ['2023-11', '2023-12', '2024-01', '2024-02']
+
+
+def rent_rows(months):
+    return pd.DataFrame([{'rent_approval_date': month, 'town': 'KALLANG/WHAMPOA' if town == 'KWN' else 'TAMPINES',
+                          'block': block, 'street_name': street, 'flat_type': flat_type,
+                          'monthly_rent': 2000 + 100 * i + 50 * j}
+                         for i, month in enumerate(months)
+                         for j, (block, street, town, _, _) in enumerate(BLOCKS)
+                         for flat_type in ['3-ROOM', '4-ROOM']])
+
+
+@pytest.fixture
+def sources(tmp_path):
+    paths = {name: str(tmp_path / f'{name}.csv') for name in ['rent', 'property', 'resale', 'address']}
+    rent_rows(MONTHS[:3]).to_csv(paths['rent'], index=False)
+    pd.DataFrame([{'blk_no': block, 'street': street, 'max_floor_lvl': 12, 'year_completed': 1985,
+                   'residential': 'Y', 'commercial': 'N', 'market_hawker': 'N', 'miscellaneous': 'N',
+                   'multistorey_carpark': 'N', 'precinct_pavilion': 'N', 'bldg_contract_town': town}
+                  for block, street, town, _, _ in BLOCKS]).to_csv(paths['property'], index=False)
+    pd.DataFrame([{'block': block, 'street_name': street, 'flat_type': flat_type.replace('-', ' '),
+                   'floor_area_sqm': area, 'flat_model': 'Improved' if area < 80 else 'New Generation'}
+                  for block, street, _, _, _ in BLOCKS
+                  for flat_type, area in [('3-ROOM', 68.0), ('4-ROOM', 92.0)]]).to_csv(paths['resale'], index=False)
+    pd.DataFrame([{'Search Name': f'{block} {street}', 'Address': f'{block} {street} SINGAPORE',
+                   'Address Lat': lat, 'Address Long': lng}
+                  for block, street, _, lat, lng in BLOCKS]).to_csv(paths['address'], index=False)
+    return paths
+
+
+def build(paths, tmp_path):
+    return run([paths['rent']], paths['resale'], str(tmp_path / 'out'), str(tmp_path / 'cache'),
+               property_path=paths['property'], address_path=paths['address'])
+
+
+def test_builds_features_and_indices(sources, tmp_path):
+    report = build(sources, tmp_path)
+    assert report['processed'] == MONTHS[:3] and not report['reused']
+
+    final = pd.read_csv(tmp_path / 'out' / 'df_final.csv')
+    assert len(final) == 3 * len(BLOCKS) * 2
+    assert list(final.columns) == [*FINAL_COLUMNS, 'year_2023', 'year_2024',
+                                   *[f'month_{m}' for m in range(1, 13)]]
+    assert final[FINAL_COLUMNS].notna().all().all()
+    assert len(pd.read_csv(tmp_path / 'out' / 'df_test.csv')) == len(BLOCKS) * 2
+    with open(tmp_path / 'out' / 'feature_indices.json') as f:
+        indices = json.load(f)
+    assert set(indices['town']) == {'KALLANG/WHAMPOA', 'TAMPINES'}
+
+
+def test_new_month_reuses_the_rest(sources, tmp_path):
+    build(sources, tmp_path)
+    assert build(sources, tmp_path)['reused'] == MONTHS[:3]
+
+    rent_rows(MONTHS).to_csv(sources['rent'], index=False)
+    report = build(sources, tmp_path)
+    assert report['processed'] == MONTHS[3:] and report['reused'] == MONTHS[:3]
+    assert report['new_addresses'] == 0
+
+
+def test_requires_geocoded_addresses(sources, tmp_path):
+    sources['address'] = str(tmp_path / 'missing.csv')
+    with pytest.raises(ValueError, match='--geocode'):
+        build(sources, tmp_path)
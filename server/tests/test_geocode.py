@@ -0,0 +1,153 @@
+import asyncio
+import json
+import time
+from collections import Counter, defaultdict
+
+import pytest
+
+web = pytest.importorskip('aiohttp.web')
+pd = pytest.importorskip('pandas')
+
+from data import geocode
+from data.geocode import QUERIES_PATH, SEARCH_PATH, GeocodeCache, Geocoder, build_tables
+
+
+class StandIn:
+    """Local stand-in for OneMap's search endpoint. failures maps a query to the HTTP
+    statuses it answers with before succeeding; queries in missing are never found."""
+
+    def __init__(self, failures=None, missing=(), delay=0.0, retry_after=None):
+        self.failures = {q: list(statuses) for q, statuses in (failures or {}).items()}
+        self.missing = set(missing)
+        self.delay = delay
+        self.retry_after = retry_after
+        self.calls = Counter()
+        self.times = defaultdict(list)
+        self.in_flight = 0
+        self.peak = 0
+
+    async def search(self, request):
+        query = request.query['searchVal']
+        self.calls[query] += 1
+        self.times[query].append(time.monotonic())
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+            if self.failures.get(query):
+                headers = {'Retry-After': str(self.retry_after)} if self.retry_after else {}
+                return web.Response(status=self.failures[query].pop(0), headers=headers)
+            if query in self.missing:
+                return web.json_response({'found': 0, 'results': []})
+            return web.json_response({'found': 1, 'results': [{
+                'BUILDING': query, 'BLK_NO': query.split(' ')[0], 'ROAD_NAME': ' '.join(query.split(' ')[1:]),
+                'LATITUDE': '1.3521', 'LONGITUDE': '103.8198'}]})
+        finally:
+            self.in_flight -= 1
+
+    @property
+    def requests(self):
+        return sum(self.calls.values())
+
+
+async def serving(stand_in, work):
+    # Runs work(base_url) against the stand-in on an ephemeral local port
+    app = web.Application()
+    app.router.add_get(SEARCH_PATH, stand_in.search)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    try:
+        host, port = runner.addresses[0][:2]
+        return await work(f'http://{host}:{port}')
+    finally:
+        await runner.cleanup()
+
+
+def search(stand_in, queries, cache_path, concurrency=4, max_retries=3):
+    async def work(base_url):
+        cache = GeocodeCache(cache_path)
+        try:
+            async with Geocoder(cache, base_url, concurrency, rate=0, max_retries=max_retries) as geocoder:
+                return await geocoder.search_many(queries), dict(geocoder.stats)
+        finally:
+            cache.close()
+    return asyncio.run(serving(stand_in, work))
+
+
+@pytest.fixture(autouse=True)
+def fast_backoff(monkeypatch):
+    monkeypatch.setattr(geocode, 'BACKOFF_SECONDS', 0.01)
+
+
+@pytest.mark.parametrize('status', [429, 500, 502, 503, 504])
+def test_retries_transient_errors(tmp_path, status):
+    stand_in = StandIn(failures={'1 BEACH RD': [status, status]})
+    results, stats = search(stand_in, ['1 BEACH RD'], tmp_path / 'cache.sqlite')
+    assert results[0]['BUILDING'] == '1 BEACH RD'
+    assert stand_in.calls['1 BEACH RD'] == 3
+    assert stats['retries'] == 2
+
+
+def test_waits_for_retry_after(tmp_path):
+    stand_in = StandIn(failures={'1 BEACH RD': [429]}, retry_after=0.3)
+    search(stand_in, ['1 BEACH RD'], tmp_path / 'cache.sqlite')
+    first, second = stand_in.times['1 BEACH RD']
+    assert second - first >= 0.3
+
+
+def test_retry_after_http_date_falls_back_to_backoff(tmp_path):
+    stand_in = StandIn(failures={'1 BEACH RD': [503]}, retry_after='Wed, 21 Oct 2015 07:28:00 GMT')
+    results, stats = search(stand_in, ['1 BEACH RD'], tmp_path / 'cache.sqlite')
+    assert results[0]['BUILDING'] == '1 BEACH RD'
+    assert stats['retries'] == 1
+
+
+def test_gives_up_after_max_retries(tmp_path):
+    stand_in = StandIn(failures={'1 BEACH RD': [503] * 5})
+    results, stats = search(stand_in, ['1 BEACH RD', '2 BEACH RD'], tmp_path / 'cache.sqlite', max_retries=2)
+    assert isinstance(results[0], RuntimeError)
+    assert results[1]['BUILDING'] == '2 BEACH RD'
+    assert stand_in.calls['1 BEACH RD'] == 3
+    assert stats['failures'] == 1
+
+
+def test_concurrency_is_bounded(tmp_path):
+    stand_in = StandIn(delay=0.05)
+    queries = [f'{n} BEACH RD' for n in range(20)]
+    results, _ = search(stand_in, queries, tmp_path / 'cache.sqlite', concurrency=3)
+    assert len(results) == 20
+    assert 1 < stand_in.peak <= 3
+
+
+def test_rerun_is_served_from_cache(tmp_path):
+    queries = ['1 BEACH RD', '2 BEACH RD', 'NOWHERE']
+    first, _ = search(StandIn(missing={'NOWHERE'}), queries, tmp_path / 'cache.sqlite')
+
+    stand_in = StandIn()
+    second, stats = search(stand_in, queries, tmp_path / 'cache.sqlite')
+    assert stand_in.requests == 0
+    assert stats['cache_hits'] == 3
+    # "No match" is cached as well
+    assert second == first and second[2] is None
+
+
+def test_tables_drop_rows_that_were_not_found(tmp_path):
+    with open(QUERIES_PATH) as f:
+        npc_queries = json.load(f)['npc']
+    rent_csv = tmp_path / 'rent.csv'
+    pd.DataFrame({'block': ['1', '2', '3'], 'street_name': ['BEACH RD'] * 3}).to_csv(rent_csv, index=False)
+    stand_in = StandIn(missing={npc_queries[0], '2 BEACH RD'})
+
+    async def work(base_url):
+        return await build_tables(['npc'], str(tmp_path), str(rent_csv), base_url, rate=0,
+                                  cache_path=str(tmp_path / 'cache.sqlite'))
+    written, failed, _ = asyncio.run(serving(stand_in, work))
+
+    assert not failed
+    npc = pd.read_csv(written['npc'][0])
+    assert len(npc) == len(npc_queries) - 1
+    assert npc_queries[0] not in set(npc['NPC'])
+    addresses = pd.read_csv(written['address'][0])
+    assert list(addresses['Search Name']) == ['1 BEACH RD', '3 BEACH RD']
@@ -0,0 +1,53 @@
+import pytest
+
+from data.records import month_range, parse_record, parse_sweep
+
+RECORD = {'addr_lat': 1.3521, 'addr_long': 103.8198, 'flat_type': '4-ROOM',
+          'area_sqft': 1000.0, 'month': 1, 'year': 2025}
+
+
+def test_parse_record():
+    assert parse_record(RECORD) == (1.3521, 103.8198, '4-ROOM', 1000.0, 1, 2025)
+
+
+@pytest.mark.parametrize('field', ['addr_lat', 'addr_long', 'area_sqft'])
+@pytest.mark.parametrize('value', ['nan', 'inf', '-inf', float('nan'), float('inf')])
+def test_parse_record_rejects_non_finite(field, value):
+    with pytest.raises(ValueError, match=f'Invalid {field}'):
+        parse_record({**RECORD, field: value})
+
+
+def test_month_range():
+    assert month_range('2024-11', '2025-02') == [(2024, 11), (2024, 12), (2025, 1), (2025, 2)]
+    assert month_range('2025-03', '2025-01') == []
+
+
+@pytest.mark.parametrize('start, end', [('2025-13', '2026-01'), ('2025-00', '2025-02'),
+                                        ('2025-01', '2025-1x'), ('2025', '2025-02')])
+def test_month_range_rejects_invalid_months(start, end):
+    with pytest.raises(ValueError, match='Invalid month'):
+        month_range(start, end)
+
+
+def test_month_range_is_capped():
+    with pytest.raises(ValueError, match='more than 12 months'):
+        month_range('2020-01', '9999-12', limit=12)
+
+
+def test_parse_sweep_rejects_out_of_range_month():
+    sweep = {'addr_lat': 1.3521, 'addr_long': 103.8198, 'flat_type': '4-ROOM', 'area_sqft': 1000,
+             'months': {'start': '2025-13', 'end': '2026-01'}}
+    with pytest.raises(ValueError, match='Invalid month'):
+        parse_sweep(sweep)
+
+
+@pytest.mark.parametrize('field, value, message', [
+    ('area_sqft', {'stop': 1200}, 'area_sqft range needs start and stop'),
+    ('area_sqft', {'start': 800}, 'area_sqft range needs start and stop'),
+    ('months', {'start': '2025-01'}, 'months range needs start and end'),
+])
+def test_parse_sweep_rejects_incomplete_ranges(field, value, message):
+    sweep = {'addr_lat': 1.3521, 'addr_long': 103.8198, 'flat_type': '4-ROOM', 'area_sqft': 1000,
+             'month': 1, 'year': 2025, field: value}
+    with pytest.raises(ValueError, match=message):
+        parse_sweep(sweep)
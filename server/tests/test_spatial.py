@@ -0,0 +1,26 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('pandas')
+pytest.importorskip('sklearn')
+great_circle = pytest.importorskip('geopy.distance').great_circle
+
+from data.spatial import DISTANCE_TOLERANCE_KM, load_amenity_indexes
+
+
+def brute_force_nearest(index, lat, long):
+    # The nested great_circle loop 02_amenities_data.ipynb used
+    coords = np.degrees(np.asarray(index.tree.data))
+    return min(great_circle((lat, long), (a_lat, a_long)).km for a_lat, a_long in coords)
+
+
+@pytest.mark.parametrize('kind', ['mrt', 'mall', 'npc', 'school', 'green'])
+def test_query_batch_matches_great_circle(kind):
+    index = load_amenity_indexes()[kind]
+    rng = np.random.default_rng(0)
+    lats = rng.uniform(1.25, 1.45, 50)
+    longs = rng.uniform(103.65, 104.0, 50)
+
+    _, dists = index.query_batch(lats, longs)
+    expected = [brute_force_nearest(index, lat, long) for lat, long in zip(lats, longs)]
+    assert np.max(np.abs(dists - expected)) <= DISTANCE_TOLERANCE_KM
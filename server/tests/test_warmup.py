@@ -0,0 +1,12 @@
+import pytest
+
+pytest.importorskip('flask')
+pytest.importorskip('flask_cors')
+
+from data.warmup import IMPORT_BUDGET_SECONDS, measure_import
+
+
+def test_server_import_is_light_and_fast():
+    elapsed, loaded = measure_import('main')
+    assert loaded == []
+    assert elapsed <= IMPORT_BUDGET_SECONDS